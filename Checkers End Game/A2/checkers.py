@@ -1,22 +1,196 @@
 import argparse
 import copy
+import random
 import sys
 import time
 
 cache = {}  # you can use this to implement state caching
 
+# Bitboards
+#
+# Only the 32 dark squares, where (row + column) is odd, are ever occupied. Dark
+# square s = 4 * row + k is at column 2k + 1 on even rows and 2k on odd rows, so a
+# position is four 32-bit masks, indexed by RED_MEN, RED_KINGS, BLACK_MEN and
+# BLACK_KINGS. A diagonal step shifts a mask by 3, 4 or 5 depending on the row
+# parity, with the edge columns masked off.
+RED_MEN = 0
+RED_KINGS = 1
+BLACK_MEN = 2
+BLACK_KINGS = 3
+piece_chars = "rRbB"
+
+FULL = 0xFFFFFFFF
+EVEN_ROWS = 0x0F0F0F0F
+ODD_ROWS = 0xF0F0F0F0
+NOT_K0 = 0xEEEEEEEE  # squares that are not the leftmost dark square of their row
+NOT_K3 = 0x77777777  # squares that are not the rightmost dark square of their row
+ROW_0 = 0x0000000F
+ROW_7 = 0xF0000000
+
+
+def up_left(bits):
+    return ((bits & EVEN_ROWS) >> 4) | ((bits & ODD_ROWS & NOT_K0) >> 5)
+
+
+def up_right(bits):
+    return ((bits & EVEN_ROWS & NOT_K3) >> 3) | ((bits & ODD_ROWS) >> 4)
+
+
+def down_left(bits):
+    return (((bits & EVEN_ROWS) << 4) | ((bits & ODD_ROWS & NOT_K0) << 3)) & FULL
+
+
+def down_right(bits):
+    return (((bits & EVEN_ROWS & NOT_K3) << 5) | ((bits & ODD_ROWS) << 4)) & FULL
+
+
+# The directions each piece moves and captures in, in the order they are tried.
+piece_steps = {
+    RED_MEN: (up_left, up_right),
+    RED_KINGS: (down_left, down_right, up_left, up_right),
+    BLACK_MEN: (down_left, down_right),
+    BLACK_KINGS: (down_left, down_right, up_left, up_right),
+}
+
+# The step back along each direction.
+opposite_step = {
+    up_left: down_right,
+    up_right: down_left,
+    down_left: up_right,
+    down_right: up_left,
+}
+
+# The bit of every dark square, column by column, as the board used to be scanned.
+column_major_bits = [1 << (4 * j + i // 2) for i in range(8) for j in range(8) if (i + j) % 2]
+
+
+def board_to_bitboards(board):
+    bitboards = [0, 0, 0, 0]
+    for j in range(8):
+        for i in range(8):
+            if (i + j) % 2 and board[j][i] != '.':
+                bitboards[piece_chars.index(board[j][i])] |= 1 << (4 * j + i // 2)
+    return tuple(bitboards)
+
+
+def bitboards_to_board(bitboards):
+    board = [['.'] * 8 for _ in range(8)]
+    for piece, bits in enumerate(bitboards):
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            square = low.bit_length() - 1
+            j = square // 4
+            board[j][2 * (square % 4) + (1 - j % 2)] = piece_chars[piece]
+    return board
+
+
+# Zobrist keys: one random 64-bit number per (dark square, piece), and one for
+# black to move. The hash of a position is the XOR of the keys of its pieces.
+zobrist_rng = random.Random(384)
+zobrist_pieces = [[zobrist_rng.getrandbits(64) for square in range(32)] for piece in range(4)]
+zobrist_black = zobrist_rng.getrandbits(64)
+
+# Bound types of transposition table entries.
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+def zobrist_hash(bitboards, player):
+    key = zobrist_black if player == "black" else 0
+    for piece, bits in enumerate(bitboards):
+        keys = zobrist_pieces[piece]
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            key ^= keys[low.bit_length() - 1]
+    return key
+
+
+class TranspositionTable:
+    # A bounded transposition table over the module-level cache dict, which maps
+    # a slot (hash modulo size) to one entry:
+    #     (hash, depth, bound, value, best move, principal variation, generation)
+    # An entry is replaced by a search of at least the same depth, or by any
+    # search of a later gts iteration.
+    def __init__(self, table, size=1 << 18):
+        self.table = table
+        self.size = size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def probe(self, key):
+        entry = self.table.get(key % self.size)
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, bound, value, best_move, pv):
+        slot = key % self.size
+        entry = self.table.get(slot)
+        if entry is None or entry[6] != self.generation or depth >= entry[1]:
+            self.table[slot] = (key, depth, bound, value, best_move, pv, self.generation)
+            self.stores += 1
+
+
+transposition_table = TranspositionTable(cache)
+
+
+class MoveHistory:
+    # What earlier searches learned about quiet moves, for node_order:
+    # killers : for each ply, the last quiet moves that caused a beta cutoff
+    #           there, most recent first
+    # history : a score for each (origin, target) pair of squares, raised by
+    #           depth * depth whenever a quiet move between them causes a cutoff
+    # gts starts each search with a new one and keeps it across its iterations.
+    def __init__(self, slots=2):
+        self.slots = slots
+        self.killers = []
+        self.history = {}
+
+    def killers_at(self, ply):
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        return self.killers[ply]
+
+    def cutoff(self, move, depth, ply):
+        if move[3] or move[4]:
+            return
+        killers = self.killers_at(ply)
+        if move in killers:
+            killers.remove(move)
+        killers.insert(0, move)
+        del killers[self.slots:]
+        square_pair = (move[1], move[2])
+        self.history[square_pair] = self.history.get(square_pair, 0) + depth * depth
+
 
 class State:
     # This class is used to represent a state.
     # board : a list of lists that represents the 8*8 board
-    def __init__(self, board):
+    # bitboards : the (red men, red kings, black men, black kings) masks
+    # Either may be given; the board is only built from the bitboards when it is
+    # first needed, which is for output.
+    def __init__(self, board=None, bitboards=None):
 
-        self.board = board
+        self._board = board
+        self.bitboards = board_to_bitboards(board) if bitboards is None else bitboards
         self.evaluation = None
 
         self.width = 8
         self.height = 8
 
+    @property
+    def board(self):
+        if self._board is None:
+            self._board = bitboards_to_board(self.bitboards)
+        return self._board
+
     def display(self):
         for i in self.board:
             for j in i:
@@ -33,11 +207,61 @@ class State:
         return s
 
 
-def get_opp_char(player):
-    if player in ['b', 'B']:
-        return ['r', 'R']
-    else:
-        return ['b', 'B']
+class Position:
+    # The one mutable position searched by alpha_beta. Moves are applied to it and
+    # undone in place, and its Zobrist hash (with red to move) and material (see
+    # evaluate) are kept up to date.
+    def __init__(self, bitboards):
+        self.bitboards = list(bitboards)
+        self.hash = zobrist_hash(bitboards, "red")
+        self.material = material(bitboards)
+
+    def apply(self, move):
+        piece, origin, target, captured_men, captured_kings, promoted, gain = move
+        bitboards = self.bitboards
+        landed = piece + 1 if promoted else piece
+        opponent_men = BLACK_MEN if piece <= RED_KINGS else RED_MEN
+        bitboards[piece] ^= origin
+        bitboards[landed] |= target
+        bitboards[opponent_men] ^= captured_men
+        bitboards[opponent_men + 1] ^= captured_kings
+        self.material += gain
+        self.hash ^= (square_key(piece, origin) ^ square_key(landed, target) ^
+                      squares_key(opponent_men, captured_men) ^
+                      squares_key(opponent_men + 1, captured_kings))
+
+    def undo(self, move):
+        piece, origin, target, captured_men, captured_kings, promoted, gain = move
+        bitboards = self.bitboards
+        landed = piece + 1 if promoted else piece
+        opponent_men = BLACK_MEN if piece <= RED_KINGS else RED_MEN
+        bitboards[landed] ^= target
+        bitboards[piece] |= origin
+        bitboards[opponent_men] |= captured_men
+        bitboards[opponent_men + 1] |= captured_kings
+        self.material -= gain
+        self.hash ^= (square_key(piece, origin) ^ square_key(landed, target) ^
+                      squares_key(opponent_men, captured_men) ^
+                      squares_key(opponent_men + 1, captured_kings))
+
+
+def square_key(piece, bit):
+    return zobrist_pieces[piece][bit.bit_length() - 1]
+
+
+def squares_key(piece, bits):
+    key = 0
+    while bits:
+        low = bits & -bits
+        bits ^= low
+        key ^= zobrist_pieces[piece][low.bit_length() - 1]
+    return key
+
+
+def moved_bitboards(bitboards, move):
+    position = Position(bitboards)
+    position.apply(move)
+    return tuple(position.bitboards)
 
 
 def get_next_turn(curr_turn):
@@ -47,430 +271,235 @@ def get_next_turn(curr_turn):
         return 'red'
 
 
-def find_multiple_captures(board, tile, j, i):
-    # Return all possible capture sequences
-    capture_sequences = []
-    if tile == "r":
-        if (i > 1 and j > 1 and (board[j - 1][i - 1] in ["b", "B"]) and
-                board[j - 2][i - 2] == "."):
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j - 1][i - 1] = '.'
-            if (j - 2) == 0:
-                new_board[j - 2][i - 2] = "R"
-            else:
-                new_board[j - 2][i - 2] = "r"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j - 2, i - 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-        if (i < 6 and j > 1 and (board[j - 1][i + 1] in ["b", "B"]) and
-                board[j - 2][i + 2] == "."):
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j - 1][i + 1] = '.'
-            if (j - 2) == 0:
-                new_board[j - 2][i + 2] = "R"
-            else:
-                new_board[j - 2][i + 2] = "r"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j - 2, i + 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-    elif tile == "R":
-        if (i > 1 and j < 6 and (board[j + 1][i - 1] in ["b", "B"]) and
-                board[j + 2][i - 2] == "."):
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j + 1][i - 1] = '.'
-            new_board[j + 2][i - 2] = "R"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j + 2, i - 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-        if (i < 6 and j < 6 and (board[j + 1][i + 1] in ["b", "B"]) and
-                board[j + 2][i + 2] == "."):
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j + 1][i + 1] = '.'
-            new_board[j + 2][i + 2] = "R"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j + 2, i + 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-        if (i > 1 and j > 1 and (board[j - 1][i - 1] in ["b", "B"]) and
-                board[j - 2][i - 2] == "."):
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j - 1][i - 1] = '.'
-            new_board[j - 2][i - 2] = "R"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j - 2, i - 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-        if (i < 6 and j > 1 and (board[j - 1][i + 1] in ["b", "B"]) and
-                board[j - 2][i + 2] == "."):
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j - 1][i + 1] = '.'
-            new_board[j - 2][i + 2] = "R"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j - 2, i + 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-    elif tile == "b":
-        if (i > 1 and j < 6 and (board[j + 1][i - 1] in ["r", "R"]) and
-                board[j + 2][i - 2] == "."):
-
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j + 1][i - 1] = '.'
-            if (j + 2) == 7:
-                new_board[j + 2][i - 2] = "B"
-            else:
-                new_board[j + 2][i - 2] = "b"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j + 2, i - 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-        if (i < 6 and j < 6 and (board[j + 1][i + 1] in ["r", "R"]) and
-                board[j + 2][i + 2] == "."):
-
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j + 1][i + 1] = '.'
-            if (j + 2) == 7:
-                new_board[j + 2][i + 2] = "B"
-            else:
-                new_board[j + 2][i + 2] = "b"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j + 2, i + 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-    elif tile == "B":
-        if (i > 1 and j < 6 and (board[j + 1][i - 1] in ["r", "R"]) and
-                board[j + 2][i - 2] == "."):
-
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j + 1][i - 1] = '.'
-            new_board[j + 2][i - 2] = "B"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j + 2, i - 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-        if (i < 6 and j < 6 and (board[j + 1][i + 1] in ["r", "R"]) and
-                board[j + 2][i + 2] == "."):
-
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j + 1][i + 1] = '.'
-            new_board[j + 2][i + 2] = "B"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j + 2, i + 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-        if (i > 1 and j > 1 and (board[j - 1][i - 1] in ["r", "R"]) and
-                board[j - 2][i - 2] == "."):
-
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j - 1][i - 1] = '.'
-            new_board[j - 2][i - 2] = "B"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j - 2, i - 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-        if (i < 6 and j > 1 and (board[j - 1][i + 1] in ["r", "R"]) and
-                board[j - 2][i + 2] == "."):
-            new_board = [row[:] for row in board]
-            new_board[j][i] = '.'
-            new_board[j - 1][i + 1] = '.'
-            new_board[j - 2][i + 2] = "B"
-
-            capture_state = State(new_board)
-            sequence = [capture_state]
-            future_sequences = find_multiple_captures(new_board, tile, j - 2, i + 2)
-
-            if future_sequences:
-                for future in future_sequences:
-                    capture_sequences.append(sequence + future)
-            else:
-                capture_sequences.append(sequence)
-
-    return capture_sequences
+# A move is recorded as the tuple
+#     (piece, origin bit, target bit, captured men, captured kings, promoted, gain)
+# where the captured masks hold the opponent pieces jumped, promoted is True
+# when a man is crowned on the target square, and gain is the change in
+# material from red's side.
 
 
-def find_possible_moves(state, turn):
-    # Return all possible moves for the current player's turn
+def make_move(piece, origin, target, captured_men, captured_kings, promoted):
+    gain = bin(captured_men).count("1") + 2 * bin(captured_kings).count("1") + promoted
+    if piece >= BLACK_MEN:
+        gain = -gain
+    return piece, origin, target, captured_men, captured_kings, promoted, gain
+
+
+def find_multiple_captures(bitboards, piece, bit):
+    # Return a move for each possible capture sequence of the piece on square
+    # bit, jumping in the order of piece_steps. A man that is crowned ends its
+    # move.
+    moves = []
+    if piece <= RED_KINGS:
+        men, kings = bitboards[BLACK_MEN], bitboards[BLACK_KINGS]
+    else:
+        men, kings = bitboards[RED_MEN], bitboards[RED_KINGS]
+    empty = ~(bitboards[0] | bitboards[1] | bitboards[2] | bitboards[3]) & FULL
+    extend_captures(piece, bit, bit, men, kings, empty, 0, 0, moves)
+    return moves
+
+
+def extend_captures(piece, origin, bit, men, kings, empty, captured_men, captured_kings, moves):
+    # Continue a capture sequence that has reached square bit, with the pieces
+    # jumped so far already taken off men, kings and empty.
+    for step in piece_steps[piece]:
+        jumped = step(bit) & (men | kings)
+        if not jumped:
+            continue
+        landing = step(jumped) & empty
+        if not landing:
+            continue
+
+        now_men = captured_men | (jumped & men)
+        now_kings = captured_kings | (jumped & kings)
+        if piece == RED_MEN and landing & ROW_0 or piece == BLACK_MEN and landing & ROW_7:
+            moves.append(make_move(piece, origin, landing, now_men, now_kings, True))
+            continue
+
+        found = len(moves)
+        extend_captures(piece, origin, landing, men & ~jumped, kings & ~jumped,
+                        (empty | bit | jumped) & ~landing, now_men, now_kings, moves)
+        if len(moves) == found:
+            moves.append(make_move(piece, origin, landing, now_men, now_kings, False))
+
+
+def capturers(bitboards, pieces, empty):
+    # Return the squares of the pieces of the given kinds that have a capture:
+    # those with an opponent piece one step away and an empty square beyond it.
+    if pieces[0] == RED_MEN:
+        opponents = bitboards[BLACK_MEN] | bitboards[BLACK_KINGS]
+    else:
+        opponents = bitboards[RED_MEN] | bitboards[RED_KINGS]
+    found = 0
+    for piece in pieces:
+        for step in piece_steps[piece]:
+            back = opposite_step[step]
+            found |= back(back(empty) & opponents) & bitboards[piece]
+    return found
+
+
+def generate_moves(bitboards, turn):
+    # Return all possible moves for the current player's turn. Captures are
+    # mandatory, so simple moves are only returned when no piece can capture.
     if turn == "black":
-        player = ["b", "B"]
+        pieces = (BLACK_MEN, BLACK_KINGS)
     else:
-        player = ["r", "R"]
-    possible_moves = []
-    possible_captures = []
-
-    for i in range(state.width):
-        for j in range(state.height):
-            if state.board[j][i] in player:
-                tile = state.board[j][i]
-                if tile == "r":
-                    capture_sequences = find_multiple_captures(state.board, tile, j, i)
-                    if capture_sequences:
-                        for capture_state in capture_sequences:
-                            possible_captures.append(capture_state[-1])
-                    else:
-                        if i > 0 and j > 0 and state.board[j - 1][i - 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            if j - 1 == 0:
-                                new_board[j - 1][i - 1] = "R"
-                            else:
-                                new_board[j - 1][i - 1] = "r"
-
-                            possible_moves.append(State(new_board))
-
-                        if i < 7 and j > 0 and state.board[j - 1][i + 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            if j - 1 == 0:
-                                new_board[j - 1][i + 1] = "R"
-                            else:
-                                new_board[j - 1][i + 1] = "r"
-
-                            possible_moves.append(State(new_board))
-                elif tile == "R":
-                    capture_sequences = find_multiple_captures(state.board, tile, j, i)
-                    if capture_sequences:
-                        for capture_state in capture_sequences:
-                            possible_captures.append(capture_state[-1])
-                    else:
-                        if i > 0 and j < 7 and state.board[j + 1][i - 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            new_board[j + 1][i - 1] = "R"
-
-                            possible_moves.append(State(new_board))
-                        if i < 7 and j < 7 and state.board[j + 1][i + 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            new_board[j + 1][i + 1] = "R"
-
-                            possible_moves.append(State(new_board))
-
-                        if i > 0 and j > 0 and state.board[j - 1][i - 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            new_board[j - 1][i - 1] = "R"
-
-                            possible_moves.append(State(new_board))
-                        if i < 7 and j > 0 and state.board[j - 1][i + 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            new_board[j - 1][i + 1] = "R"
-
-                            possible_moves.append(State(new_board))
-
-                elif tile == "b":
-                    capture_sequences = find_multiple_captures(state.board, tile, j, i)
-                    if capture_sequences:
-                        for capture_state in capture_sequences:
-                            possible_captures.append(capture_state[-1])
-                    else:
-                        if i > 0 and j < 7 and state.board[j + 1][i - 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            if j + 1 == 7:
-                                new_board[j + 1][i - 1] = "B"
-                            else:
-                                new_board[j + 1][i - 1] = "b"
-
-                            possible_moves.append(State(new_board))
-                        if i < 7 and j < 7 and state.board[j + 1][i + 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            if j + 1 == 7:
-                                new_board[j + 1][i + 1] = "B"
-                            else:
-                                new_board[j + 1][i + 1] = "b"
-
-                            possible_moves.append(State(new_board))
-
-                elif tile == "B":
-                    capture_sequences = find_multiple_captures(state.board, tile, j, i)
-                    if capture_sequences:
-                        for capture_state in capture_sequences:
-                            possible_captures.append(capture_state[-1])
-                    else:
-                        if i > 0 and j < 7 and state.board[j + 1][i - 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            new_board[j + 1][i - 1] = "B"
-
-                            possible_moves.append(State(new_board))
-                        if i < 7 and j < 7 and state.board[j + 1][i + 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            new_board[j + 1][i + 1] = "B"
-
-                            possible_moves.append(State(new_board))
-
-                        if i > 0 and j > 0 and state.board[j - 1][i - 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            new_board[j - 1][i - 1] = "B"
-
-                            possible_moves.append(State(new_board))
-                        if i < 7 and j > 0 and state.board[j - 1][i + 1] == ".":
-                            new_board = [row[:] for row in state.board]
-                            new_board[j][i] = "."
-                            new_board[j - 1][i + 1] = "B"
-
-                            possible_moves.append(State(new_board))
-
-    if possible_captures:
+        pieces = (RED_MEN, RED_KINGS)
+    empty = ~(bitboards[0] | bitboards[1] | bitboards[2] | bitboards[3]) & FULL
+    men = bitboards[pieces[0]]
+
+    jumpers = capturers(bitboards, pieces, empty)
+    if jumpers:
+        possible_captures = []
+        for bit in column_major_bits:
+            if bit & jumpers:
+                piece = pieces[0] if bit & men else pieces[1]
+                possible_captures.extend(find_multiple_captures(bitboards, piece, bit))
         return possible_captures
 
-    return possible_moves
-
-
-def node_order(successors, turn):
-    for successor in successors:
-        successor.evaluation = evaluate(successor, turn)
+    possible_moves = []
+    movers = men | bitboards[pieces[1]]
+    crowning_row = ROW_0 if turn == "red" else ROW_7
+    sign = 1 if turn == "red" else -1
+    for bit in column_major_bits:
+        if not bit & movers:
+            continue
+        piece = pieces[0] if bit & men else pieces[1]
+        for step in piece_steps[piece]:
+            target = step(bit) & empty
+            if not target:
+                continue
+            promoted = piece == pieces[0] and target & crowning_row != 0
+            possible_moves.append((piece, bit, target, 0, 0, promoted, sign * promoted))
 
-    if turn == "red":
-        return sorted(successors, key=lambda k: k.evaluation, reverse=True)
-    elif turn == "black":
-        return sorted(successors, key=lambda k: k.evaluation)
+    return possible_moves
 
 
-def alpha_beta(state, MIN, MAX, player, alpha, beta, depth, path=[]):
-    # Return the best move for current turn
-    if terminal(state, player):
-        return utility(depth, get_next_turn(player)), state, path + [state]
+def find_possible_moves(state, turn):
+    # Return the states reached by all possible moves for the current player's turn
+    return [State(bitboards=moved_bitboards(state.bitboards, move))
+            for move in generate_moves(state.bitboards, turn)]
+
+
+def node_order(moves, turn, move_history, best_move=None, ply=0):
+    # Order the moves of turn at ply: best_move, the best move found by an earlier
+    # search of this position if any, then moves that gain material (captures
+    # and crownings) by their gain, then the killer moves of this ply, then the
+    # remaining moves by their history score (see MoveHistory).
+    sign = 1 if turn == "red" else -1
+    killers = move_history.killers_at(ply)
+    history = move_history.history
+
+    def priority(move):
+        gain = sign * move[6]
+        if gain:
+            return 2, gain
+        if move in killers:
+            return 1, -killers.index(move)
+        return 0, history.get((move[1], move[2]), 0)
+
+    ordered = sorted(moves, key=priority, reverse=True)
+
+    if best_move is not None and best_move in ordered:
+        ordered.remove(best_move)
+        ordered.insert(0, best_move)
+    return ordered
+
+
+def alpha_beta(position, MIN, MAX, player, alpha, beta, depth, ply=0, pv=None,
+               move_history=None):
+    # Return the value of position for the player to move. The best line found is
+    # left in pv[ply], as the moves from this position on; pv is a triangular
+    # table with a row for each ply, so a node only copies its child's row when
+    # its best move changes. move_history is updated on beta cutoffs.
+    if pv is None:
+        pv = [[] for _ in range(depth + 1)]
+    if move_history is None:
+        move_history = MoveHistory()
+    pv[ply] = []
+
+    key = position.hash ^ zobrist_black if player == "black" else position.hash
+    entry = transposition_table.probe(key)
+    tt_move = None
+    if entry is not None:
+        tt_move = entry[4]
+        # Values count the remaining depth (see utility), so only an entry of the
+        # same depth can stand in for this search.
+        if entry[1] == depth:
+            bound, value = entry[2], entry[3]
+            if bound == EXACT:
+                pv[ply] = list(entry[5])
+                return value
+            if bound == LOWER and value >= beta or bound == UPPER and value <= alpha:
+                return value
+
+    # The moves are generated once, both to test for the end of the game and to
+    # search.
+    moves = generate_moves(position.bitboards, player)
+    if not moves:
+        return utility(depth, get_next_turn(player))
     if depth == 0:
-        return evaluate(state, player), state, path + [state]
+        return evaluate(position, player)
+
+    alpha_orig, beta_orig = alpha, beta
 
     if MAX:
         evalMAX = -float('inf')
         best_move = None
-        best_path = []
 
-        successors = find_possible_moves(state, "red")
-        successors_sorted = node_order(successors, "red")
-        for successor in successors_sorted:
-            value, state2, path2 = alpha_beta(successor, True, False, get_next_turn(player), alpha, beta,
-                                              depth - 1, path+[state])
+        for move in node_order(moves, "red", move_history, tt_move, ply):
+            position.apply(move)
+            value = alpha_beta(position, True, False, get_next_turn(player), alpha, beta,
+                               depth - 1, ply + 1, pv, move_history)
+            position.undo(move)
             if value > evalMAX:
                 evalMAX = value
-                best_move = successor
-                best_path = path2
+                best_move = move
+                pv[ply] = [move] + pv[ply + 1]
 
             alpha = max(alpha, value)
 
             if beta <= alpha:
+                move_history.cutoff(move, depth, ply)
                 break
 
-        return evalMAX, best_move, best_path
+        store(key, depth, evalMAX, alpha_orig, beta_orig, best_move, pv[ply])
+        return evalMAX
 
     elif MIN:
         evalMIN = float('inf')
         best_move = None
-        best_path = []
 
-        successors = find_possible_moves(state, "black")
-        successors_sorted = node_order(successors, "black")
-        for successor in successors_sorted:
-            value, state2, path2 = alpha_beta(successor, False, True, get_next_turn(player), alpha, beta,
-                                              depth - 1, path+[state])
+        for move in node_order(moves, "black", move_history, tt_move, ply):
+            position.apply(move)
+            value = alpha_beta(position, False, True, get_next_turn(player), alpha, beta,
+                               depth - 1, ply + 1, pv, move_history)
+            position.undo(move)
             if value < evalMIN:
                 evalMIN = value
-                best_move = successor
-                best_path = path2
+                best_move = move
+                pv[ply] = [move] + pv[ply + 1]
 
             beta = min(beta, value)
 
             if beta <= alpha:
+                move_history.cutoff(move, depth, ply)
                 break
 
-        return evalMIN, best_move, best_path
+        store(key, depth, evalMIN, alpha_orig, beta_orig, best_move, pv[ply])
+        return evalMIN
+
+
+def store(key, depth, value, alpha, beta, best_move, line):
+    # Record a search result, with its bound type relative to the window it was
+    # searched with, and the best line from this node on.
+    if value <= alpha:
+        bound = UPPER
+    elif value >= beta:
+        bound = LOWER
+    else:
+        bound = EXACT
+    transposition_table.store(key, depth, bound, value, best_move, tuple(line))
 
 
 def terminal(state, turn):
@@ -479,32 +508,16 @@ def terminal(state, turn):
     return False
 
 
-def evaluate(state, turn):
-    if turn == "black":
-        player = ["b", "B"]
-    else:
-        player = ["r", "R"]
-
-    opp_player = get_opp_char(turn[0])
-
-    kings_num = normal_num = opp_kings = opp_normal = 0
-
-    for i in range(8):
-        for j in range(8):
-            if state.board[j][i] in player and state.board[j][i].isupper():
-                kings_num += 1
-            elif state.board[j][i] in player and state.board[j][i].islower():
-                normal_num += 1
-            elif state.board[j][i] in opp_player and state.board[j][i].isupper():
-                opp_kings += 1
-            elif state.board[j][i] in opp_player and state.board[j][i].islower():
-                opp_normal += 1
+def evaluate(position, turn):
+    # Material from red's side, whichever side is to move: a king counts 2 and a
+    # man 1. The position keeps it up to date as moves are applied.
+    return position.material
 
-    total_points = (2 * kings_num + normal_num) - (2 * opp_kings + opp_normal)
 
-    if turn == "red":
-        return total_points
-    return -total_points
+def material(bitboards):
+    red_men, red_kings, black_men, black_kings = bitboards
+    return (2 * bin(red_kings).count("1") + bin(red_men).count("1") -
+            2 * bin(black_kings).count("1") - bin(black_men).count("1"))
 
 
 def utility(depth, winner):
@@ -514,6 +527,21 @@ def utility(depth, winner):
         return -9999999999 - depth
 
 
+def principal_variation(position, MIN, MAX, player, alpha, beta, depth, move_history):
+    # Search position to depth and return its value and the states along the
+    # principal variation, starting with position itself.
+    pv = [[] for _ in range(depth + 1)]
+    evaluation = alpha_beta(position, MIN, MAX, player, alpha, beta, depth, 0, pv,
+                            move_history)
+
+    bitboards = tuple(position.bitboards)
+    path = [State(bitboards=bitboards)]
+    for move in pv[0]:
+        bitboards = moved_bitboards(bitboards, move)
+        path.append(State(bitboards=bitboards))
+    return evaluation, path
+
+
 def gts(state, turn):
     depth = 1
     player = "red"
@@ -531,14 +559,19 @@ def gts(state, turn):
         MAX = False
         MIN = True
 
-    evaluation, best_state, path = alpha_beta(state, MIN, MAX, player, alpha, beta, depth)
+    position = Position(state.bitboards)
+    move_history = MoveHistory()
+    evaluation, path = principal_variation(position, MIN, MAX, player, alpha, beta, depth,
+                                           move_history)
 
     # ids
 
     if not terminal(path[-1], get_next_turn(player)):
         while not terminal(path[-1], get_next_turn(player)):
             depth += 1
-            evaluation, best_state, path = alpha_beta(state, MIN, MAX, player, alpha, beta, depth)
+            transposition_table.generation += 1
+            evaluation, path = principal_variation(position, MIN, MAX, player, alpha, beta, depth,
+                                                   move_history)
 
     string = ""
     for k in path:
@@ -588,3 +621,5 @@ if __name__ == '__main__':
     end_time = time.time()
     elapsed_time = end_time - start_time
     print(f"\nElapsed time: {elapsed_time} seconds\n")
+    print(f"Transposition table: {transposition_table.hits} hits, "
+          f"{transposition_table.misses} misses, {transposition_table.stores} stores\n")
@@ -0,0 +1,287 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import tempfile
+import time
+
+from generate import generate_puzzle
+from hrd import SearchStats, SearchTimeout, raise_timeout, read_from_file, solve
+
+# The algorithms whose solutions are optimal, and so must match the length of
+# the reference .out files.
+optimal_algos = {"astar", "ida", "bidir", "hda"}
+
+# The algorithms whose node counts vary from run to run, as they depend on the
+# timing of their worker processes. Their counts get the same tolerance as times.
+nondeterministic_algos = {"hda"}
+
+# The seconds a run may take past its time limit before its process is killed.
+kill_grace = 5
+
+# A run is slower than its baseline when it takes more than (1 + tolerance)
+# times as long, and at least this many seconds longer.
+min_slowdown = 0.05
+
+
+def reference_moves(inputfile):
+    """
+    Find the number of moves in the reference solution of a test case, stored
+    next to it as <name>.out or <name>-<anything>.out.
+
+    :return: The number of moves, None if the reference has no solution, or
+        False if there is no reference file.
+    :rtype: Union[int, None, bool]
+    """
+    stem = os.path.splitext(inputfile)[0]
+    candidates = glob.glob(glob.escape(stem) + ".out") + glob.glob(glob.escape(stem) + "-*.out")
+    if not candidates:
+        return False
+    with open(candidates[0]) as f:
+        text = f.read()
+    if text.startswith("No solution"):
+        return None
+    return len([grid for grid in text.split("\n\n") if grid.strip()]) - 1
+
+
+def run_case(inputfile, algo, timeout):
+    """
+    Solve one puzzle; run in a fresh process by run_isolated, so that the peak
+    memory is that of this puzzle alone.
+
+    :param timeout: The time limit in seconds, or None for no limit.
+    :type timeout: Optional[float]
+    :return: The measurements of the run.
+    :rtype: dict
+    """
+    board, goal_board = read_from_file(inputfile)
+    stats = SearchStats()
+    use_alarm = timeout and hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        path = solve(board, goal_board, algo, stats=stats)
+        timed_out = False
+    except SearchTimeout:
+        path = None
+        timed_out = True
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return {
+        "timeout": timed_out,
+        "moves": None if path is None else len(path) - 1,
+        "seconds": round(stats.seconds, 4),
+        "expanded": stats.expanded,
+        "nodes_per_second": round(stats.expanded / stats.seconds) if stats.seconds else None,
+        "peak_memory_kb": stats.peak_memory_kb,
+    }
+
+
+def report_case(results, inputfile, algo, timeout):
+    results.put(run_case(inputfile, algo, timeout))
+
+
+def run_isolated(inputfile, algo, timeout):
+    """
+    Run run_case in its own process. The process is not a daemon, so hda can
+    start its workers from it, and it is killed if it outlives the time limit by
+    more than kill_grace seconds.
+
+    :return: The measurements of the run.
+    :rtype: dict
+    """
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=report_case, args=(results, inputfile, algo, timeout))
+    process.start()
+    deadline = time.time() + timeout + kill_grace if timeout else None
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                raise RuntimeError("{} with {} exited with code {}".format(
+                    inputfile, algo, process.exitcode))
+            if deadline is not None and time.time() > deadline:
+                process.terminate()
+                result = {"timeout": True, "moves": None, "seconds": timeout, "expanded": 0,
+                          "nodes_per_second": None, "peak_memory_kb": None}
+                break
+    process.join()
+    return result
+
+
+def benchmark_cases(test_dir, heights, count, depth, seed, directory):
+    """
+    List the puzzles to benchmark: every test case, then count generated puzzles
+    of the given optimal depth for each height, written to directory.
+
+    :return: (name, input file, expected moves) triples, where expected moves is
+        as for reference_moves.
+    :rtype: List[Tuple[str, str, Union[int, None, bool]]]
+    """
+    cases = []
+    for inputfile in sorted(glob.glob(os.path.join(glob.escape(test_dir), "*.txt"))):
+        name = os.path.splitext(os.path.basename(inputfile))[0]
+        cases.append((name, inputfile, reference_moves(inputfile)))
+    for height in heights:
+        for i in range(count):
+            name = "random-h{}-{}".format(height, i)
+            inputfile = os.path.join(directory, name + ".txt")
+            text = generate_puzzle(height, depth, "{}-{}-{}".format(seed, height, i))
+            if text is None:
+                print("{}: no board at depth {}".format(name, depth), file=sys.stderr)
+                continue
+            with open(inputfile, 'w') as f:
+                f.write(text)
+            cases.append((name, inputfile, depth))
+    return cases
+
+
+def check(name, algo, result, expected, baseline, tolerance):
+    """
+    :return: The problems found with one run, compared with its expected length
+        and its baseline measurements, if any.
+    :rtype: List[str]
+    """
+    problems = []
+    moves = result["moves"]
+    if result["timeout"]:
+        # Only a run that used to finish in time is a regression.
+        if baseline is not None and not baseline["timeout"]:
+            problems.append("timed out, baseline {:.3f}s".format(baseline["seconds"]))
+        return problems
+    if expected is not False:
+        if (moves is None) != (expected is None):
+            problems.append("solved is {}, expected {}".format(moves is not None, expected is not None))
+        elif algo in optimal_algos and moves != expected:
+            problems.append("{} moves, expected {}".format(moves, expected))
+
+    if baseline is not None and not baseline["timeout"]:
+        if moves != baseline["moves"]:
+            problems.append("{} moves, baseline {}".format(moves, baseline["moves"]))
+        expanded_limit = baseline["expanded"]
+        if algo in nondeterministic_algos:
+            expanded_limit *= 1 + tolerance
+        if result["expanded"] > expanded_limit:
+            problems.append("{} nodes expanded, baseline {}".format(result["expanded"],
+                                                                   baseline["expanded"]))
+        limit = max(baseline["seconds"] * (1 + tolerance), baseline["seconds"] + min_slowdown)
+        if result["seconds"] > limit:
+            problems.append("{:.3f}s, baseline {:.3f}s".format(result["seconds"],
+                                                              baseline["seconds"]))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark hrd.py on the test cases and on generated puzzles.")
+    parser.add_argument(
+        "--algos",
+        nargs="+",
+        default=["astar", "dfs"],
+        choices=["astar", "dfs", "ida", "bidir", "hda"],
+        help="The algorithms to benchmark."
+    )
+    parser.add_argument(
+        "--tests",
+        type=str,
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Test Cases"),
+        help="The directory of test cases (*.txt, with reference *.out files)."
+    )
+    parser.add_argument(
+        "--heights",
+        type=int,
+        nargs="*",
+        default=[5, 6, 7],
+        help="The board heights of the generated puzzles."
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=3,
+        help="The number of generated puzzles for each height."
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=30,
+        help="The optimal solution length of each generated puzzle."
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="The seed of the generated puzzles."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60,
+        help="The time limit in seconds of each run; runs past it are reported as timeouts."
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        metavar="FILE",
+        help="Fail on runs slower, expanding more nodes or with other lengths than FILE."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="The fraction by which a run may be slower than its baseline."
+    )
+    parser.add_argument(
+        "--save-baseline",
+        type=str,
+        metavar="FILE",
+        help="Write the results to FILE, for later use with --baseline."
+    )
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        cases = benchmark_cases(args.tests, args.heights, args.count, args.depth, args.seed,
+                                directory)
+        for name, inputfile, expected in cases:
+            for algo in args.algos:
+                label = "{}/{}".format(name, algo)
+                result = run_isolated(inputfile, algo, args.timeout)
+                results[label] = result
+                problems = check(name, algo, result, expected, baseline.get(label),
+                                 args.tolerance)
+                failures += bool(problems)
+                if problems:
+                    status = "FAIL: " + "; ".join(problems)
+                else:
+                    status = "timeout" if result["timeout"] else "ok"
+                print("{:<24} {:>6} moves {:>9.3f}s {:>10} nodes/s {:>9} KB  {}".format(
+                    label, str(result["moves"]), result["seconds"],
+                    str(result["nodes_per_second"]), str(result["peak_memory_kb"]), status),
+                    flush=True)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({"algos": args.algos, "heights": args.heights, "count": args.count,
+                       "depth": args.depth, "seed": args.seed, "results": results}, f, indent=2)
+
+    if failures:
+        print("{} of {} runs failed".format(failures, len(results)), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import argparse
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from hrd import BoardCodec, bidirectional, char_single, grid_to_string, read_from_file
+
+# ====================================================================================
+# Random puzzles
+#
+# A puzzle is made by taking a goal board, given or laid out at random, and
+# moving away from it. Every move can be undone, so the start board can always
+# be solved back to the goal. Two methods aim for an exact optimal depth:
+#
+#   - bfs: a breadth first search from the goal down to the target depth, then a
+#     random board of the last layer. Exact, but it holds every board up to the
+#     target depth in memory.
+#   - walk: a random walk away from the goal, measuring the optimal depth of the
+#     board reached with a bidirectional search. A move changes the depth by at
+#     most one, so after measuring depth d the walk can safely take target - d
+#     more moves before measuring again.
+
+
+def random_layout(height, rng):
+    """
+    Lay out a random board: one 2x2 piece, two blank cells, and the rest of the
+    cells filled with randomly chosen 1x1, vertical and horizontal pieces.
+
+    :param height: The height of the board, at least 3.
+    :type height: int
+    :param rng: The random number generator to draw from.
+    :type rng: random.Random
+    :return: The grid of the board, as in Board.grid.
+    :rtype: List[List[str]]
+    """
+    grid = [[None] * 4 for _ in range(height)]
+
+    x, y = rng.randrange(3), rng.randrange(height - 1)
+    for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1)):
+        grid[y + dy][x + dx] = '1'
+
+    free = [(x, y) for y in range(height) for x in range(4) if grid[y][x] is None]
+    for x, y in rng.sample(free, 2):
+        grid[y][x] = '.'
+
+    for y in range(height):
+        for x in range(4):
+            if grid[y][x] is not None:
+                continue
+            shapes = [char_single]
+            if x + 1 < 4 and grid[y][x + 1] is None:
+                shapes.append('<')
+            if y + 1 < height and grid[y + 1][x] is None:
+                shapes.append('^')
+            shape = rng.choice(shapes)
+            if shape == '<':
+                grid[y][x], grid[y][x + 1] = '<', '>'
+            elif shape == '^':
+                grid[y][x], grid[y + 1][x] = '^', 'v'
+            else:
+                grid[y][x] = char_single
+    return grid
+
+
+def random_walk(codec, key, steps, rng):
+    """
+    :param codec: The codec of the board height.
+    :type codec: BoardCodec
+    :param key: The packed key to walk from.
+    :type key: int
+    :param steps: The number of random moves to make.
+    :type steps: int
+    :param rng: The random number generator to draw from.
+    :type rng: random.Random
+    :return: The packed key reached. The walk never steps straight back to the
+        board it just left, unless that is the only move.
+    :rtype: int
+    """
+    previous = None
+    for _ in range(steps):
+        successors = codec.successors(key)
+        forward = [successor for successor in successors if successor != previous]
+        previous, key = key, rng.choice(forward or successors)
+    return key
+
+
+def optimal_depth(codec, start, goal):
+    """
+    :return: The number of moves of an optimal solution from start to goal, both
+        packed keys, or None if there is none.
+    :rtype: Optional[int]
+    """
+    path = bidirectional(codec.decode(start), codec.decode(goal))
+    return None if path is None else len(path) - 1
+
+
+def bfs_start(codec, goal, depth, rng):
+    """
+    :return: A random packed key exactly depth moves from goal, or None if no
+        board is that far from it.
+    :rtype: Optional[int]
+    """
+    seen = {goal}
+    layer = [goal]
+    for _ in range(depth):
+        next_layer = []
+        for key in layer:
+            for successor in codec.successors(key):
+                if successor not in seen:
+                    seen.add(successor)
+                    next_layer.append(successor)
+        if not next_layer:
+            return None
+        layer = next_layer
+    return rng.choice(layer)
+
+
+def walk_start(codec, goal, depth, rng, max_steps=None):
+    """
+    :param max_steps: The number of moves to walk before giving up (default: 50
+        times the depth).
+    :type max_steps: Optional[int]
+    :return: A packed key exactly depth moves from goal, found by a random walk,
+        or None if the walk did not get there within max_steps moves.
+    :rtype: Optional[int]
+    """
+    if max_steps is None:
+        max_steps = 50 * max(depth, 1)
+    key = goal
+    reached = 0
+    steps = 0
+    while reached != depth and steps < max_steps:
+        key = random_walk(codec, key, depth - reached, rng)
+        steps += depth - reached
+        reached = optimal_depth(codec, key, goal)
+    return key if reached == depth else None
+
+
+def puzzle_text(start_grid, goal_grid):
+    """
+    :return: A puzzle in the format of read_from_file: the initial board, an
+        empty line and the goal board.
+    :rtype: str
+    """
+    return grid_to_string(start_grid) + "\n" + grid_to_string(goal_grid)
+
+
+def generate_puzzle(height, depth, seed, method="bfs", goal_grid=None, attempts=20):
+    """
+    Make one puzzle whose optimal solution has exactly depth moves.
+
+    :param height: The height of the board.
+    :type height: int
+    :param depth: The number of moves of an optimal solution.
+    :type depth: int
+    :param seed: The seed of the puzzle; equal arguments give equal puzzles.
+    :param method: "bfs" or "walk" (see above).
+    :type method: str
+    :param goal_grid: The goal board, or None for random goal layouts.
+    :type goal_grid: Optional[List[List[str]]]
+    :param attempts: The number of random goal layouts to try, when the goal is
+        not given, before giving up.
+    :type attempts: int
+    :return: The puzzle, as puzzle_text, or None if none was found.
+    :rtype: Optional[str]
+    """
+    rng = random.Random(seed)
+    codec = BoardCodec(height)
+    find_start = bfs_start if method == "bfs" else walk_start
+    for _ in range(1 if goal_grid is not None else attempts):
+        goal = goal_grid if goal_grid is not None else random_layout(height, rng)
+        start = find_start(codec, codec.encode_grid(goal), depth, rng)
+        if start is not None:
+            return puzzle_text(codec.grid(start), goal)
+    return None
+
+
+def write_puzzle(filename, height, depth, seed, method, goal_grid):
+    """
+    Make one puzzle with generate_puzzle and write it to filename.
+
+    :return: filename, or None if no puzzle was found.
+    :rtype: Optional[str]
+    """
+    text = generate_puzzle(height, depth, seed, method, goal_grid)
+    if text is None:
+        return None
+    with open(filename, 'w') as f:
+        f.write(text)
+    return filename
+
+
+def generate(directory, count, height, depth, seed, method="bfs", goal_grid=None,
+             processes=None):
+    """
+    Write count puzzles of the given optimal depth to directory, as
+    puzzle-<depth>-<index>.txt. Puzzle i is seeded from (seed, i) alone, so the
+    output does not depend on the number of processes.
+
+    :param processes: The number of worker processes (default: one per CPU).
+    :type processes: Optional[int]
+    :return: The files written, by index, with None for puzzles not found.
+    :rtype: List[Optional[str]]
+    """
+    os.makedirs(directory, exist_ok=True)
+    if goal_grid is not None:
+        height = len(goal_grid)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(write_puzzle,
+                               os.path.join(directory, "puzzle-{}-{}.txt".format(depth, i)),
+                               height, depth, "{}-{}".format(seed, i), method, goal_grid)
+                   for i in range(count)]
+        return [future.result() for future in futures]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write random solvable puzzles of a given optimal solution depth.")
+    parser.add_argument(
+        "--outdir",
+        type=str,
+        required=True,
+        help="The directory to write the puzzles to."
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        required=True,
+        help="The number of moves of an optimal solution of every puzzle."
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=1,
+        help="The number of puzzles to write."
+    )
+    parser.add_argument(
+        "--height",
+        type=int,
+        default=5,
+        help="The height of the boards, when --goal is not given."
+    )
+    parser.add_argument(
+        "--goal",
+        type=str,
+        metavar="FILE",
+        help="Use the goal board of a puzzle file instead of random goal layouts."
+    )
+    parser.add_argument(
+        "--method",
+        type=str,
+        default="bfs",
+        choices=["bfs", "walk"],
+        help="Pick from the breadth first layer at the depth, or walk away from the goal."
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="The seed; equal arguments write equal puzzles."
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="The number of worker processes (default: one per CPU)."
+    )
+    args = parser.parse_args()
+
+    goal_grid = read_from_file(args.goal)[1].grid if args.goal else None
+    written = generate(args.outdir, args.count, args.height, args.depth, args.seed, args.method,
+                       goal_grid, args.processes)
+    for i, filename in enumerate(written):
+        print(filename if filename else "puzzle {}: no board at depth {}".format(i, args.depth))
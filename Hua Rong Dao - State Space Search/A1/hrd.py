@@ -1,20 +1,41 @@
 import argparse
+import glob
+import hashlib
+import json
+import math
+import mmap
+import os
+import signal
+import struct
 import sys
+import time
 import heapq
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 # ====================================================================================
 
 char_single = '2'
 
+# (dx, dy) of each move direction, and the move that undoes it.
+move_deltas = {"d": (0, 1), "u": (0, -1), "r": (1, 0), "l": (-1, 0)}
+opposite_moves = {"d": "u", "u": "d", "r": "l", "l": "r"}
+
 
 class PriorityQueue:
-    def __init__(self):
+    def __init__(self, stats=None):
         self.heap = []
         self.count = 0
 
-    def insert(self, item):
-        # Use a tuple (item.f, count, item) to ensure the heap is ordered by item.f
-        heapq.heappush(self.heap, (item.f, self.count, item))
+    def insert(self, f, g, key, item):
+        # Use a tuple (f, count, item) to ensure the heap is ordered by f
+        heapq.heappush(self.heap, (f, self.count, item))
         self.count += 1
 
     def extract(self):
@@ -24,6 +45,247 @@ class PriorityQueue:
     def is_empty(self):
         return len(self.heap) == 0
 
+    def __len__(self):
+        return len(self.heap)
+
+
+class IndexedPriorityQueue:
+    """
+    A binary heap holding at most one entry per key. Inserting a key that is
+    already queued lowers its f in place (decrease-key) instead of pushing a
+    second entry that would later be popped as stale, or is ignored when the
+    new f is no smaller.
+    """
+
+    def __init__(self, stats=None):
+        """
+        :param stats: Counters whose stale_avoided is incremented for every
+            insert that did not add a second entry for a key.
+        :type stats: Optional[SearchStats]
+        """
+        # [f, count, key, item] entries, and the heap position of each key.
+        self.heap = []
+        self.position = {}
+        self.count = 0
+        self.stats = stats
+
+    def insert(self, f, g, key, item):
+        i = self.position.get(key)
+        if i is None:
+            entry = [f, self.count, key, item]
+            self.heap.append(entry)
+            i = len(self.heap) - 1
+        else:
+            if self.stats is not None:
+                self.stats.stale_avoided += 1
+            entry = self.heap[i]
+            if f >= entry[0]:
+                return
+            entry[0] = f
+            entry[1] = self.count
+            entry[3] = item
+        self.count += 1
+        self.__sift_up(i, entry)
+
+    def extract(self):
+        heap = self.heap
+        top = heap[0]
+        del self.position[top[2]]
+        last = heap.pop()
+        if heap:
+            self.__sift_down(0, last)
+        return top[3]
+
+    def is_empty(self):
+        return len(self.heap) == 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __sift_up(self, i, entry):
+        heap = self.heap
+        position = self.position
+        order = (entry[0], entry[1])
+        while i > 0:
+            parent = (i - 1) >> 1
+            above = heap[parent]
+            if (above[0], above[1]) <= order:
+                break
+            heap[i] = above
+            position[above[2]] = i
+            i = parent
+        heap[i] = entry
+        position[entry[2]] = i
+
+    def __sift_down(self, i, entry):
+        heap = self.heap
+        position = self.position
+        size = len(heap)
+        order = (entry[0], entry[1])
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            right = child + 1
+            if right < size and (heap[right][0], heap[right][1]) < (heap[child][0], heap[child][1]):
+                child = right
+            below = heap[child]
+            if order <= (below[0], below[1]):
+                break
+            heap[i] = below
+            position[below[2]] = i
+            i = child
+        heap[i] = entry
+        position[entry[2]] = i
+
+
+class BucketQueue:
+    """
+    A frontier for small integer f values: one bucket per f, each split into
+    one stack per g. Extraction takes the smallest f and, among those, the
+    largest g, which is the entry closest to the goal by the heuristic.
+
+    Inserts are O(1) and extracts are O(1) amortized, as the f and g pointers
+    only move past buckets that have been emptied.
+
+    Entries with an infinite f, whose boards cannot reach the goal, are dropped
+    rather than given a bucket.
+    """
+
+    def __init__(self, stats=None):
+        # buckets[f][g] is a stack of items.
+        self.buckets = []
+        # The largest g that may be non empty in each bucket.
+        self.top = []
+        # The smallest f that may be non empty.
+        self.low = 0
+        self.size = 0
+
+    def insert(self, f, g, key, item):
+        if f == float("inf"):
+            return
+        buckets = self.buckets
+        while len(buckets) <= f:
+            buckets.append([])
+            self.top.append(-1)
+        levels = buckets[f]
+        while len(levels) <= g:
+            levels.append([])
+        levels[g].append(item)
+        if g > self.top[f]:
+            self.top[f] = g
+        if f < self.low:
+            self.low = f
+        self.size += 1
+
+    def extract(self):
+        buckets = self.buckets
+        top = self.top
+        f = self.low
+        while top[f] < 0:
+            f += 1
+        levels = buckets[f]
+        g = top[f]
+        while not levels[g]:
+            g -= 1
+        item = levels[g].pop()
+        # Step past an emptied g stack, and the whole bucket when it is empty.
+        while g >= 0 and not levels[g]:
+            g -= 1
+        top[f] = g
+        self.low = f
+        self.size -= 1
+        return item
+
+    def is_empty(self):
+        return self.size == 0
+
+    def __len__(self):
+        return self.size
+
+
+# The frontiers astar can use, by their --frontier name.
+frontiers = {"heap": PriorityQueue, "indexed": IndexedPriorityQueue, "bucket": BucketQueue}
+
+
+class SearchStats:
+    """
+    Counters filled in by a search.
+    """
+
+    def __init__(self, progress=None, progress_every=10000):
+        """
+        :param progress: Called as progress(stats, bound, frontier_size) every
+            progress_every expansions, where bound is the f value being expanded
+            (the depth for dfs and bidir).
+        :type progress: Optional[Callable]
+        :param progress_every: The number of expansions between progress calls.
+        :type progress_every: int
+        """
+
+        # The number of states whose successors were generated.
+        self.expanded = 0
+        # The number of successors generated.
+        self.generated = 0
+        # The number of states dropped because their board was already explored.
+        self.duplicates = 0
+        # The number of frontier inserts that updated or kept an entry already
+        # queued for the same board, rather than leaving a stale entry behind.
+        self.stale_avoided = 0
+        self.max_frontier = 0
+        # Seconds spent computing heuristic values.
+        self.heuristic_time = 0.0
+        # Seconds spent in the search, and the peak resident memory of the
+        # process at its end, both set by finish.
+        self.seconds = 0.0
+        self.peak_memory_kb = None
+
+        self.progress = progress
+        self.progress_every = progress_every
+
+    def expand(self, bound, frontier_size):
+        """
+        Count one expansion.
+
+        :param bound: The f value being expanded (the depth for dfs and bidir).
+        :type bound: int
+        :param frontier_size: The number of entries in the frontier.
+        :type frontier_size: int
+        """
+        self.expanded += 1
+        if frontier_size > self.max_frontier:
+            self.max_frontier = frontier_size
+        if self.progress is not None and self.expanded % self.progress_every == 0:
+            self.progress(self, bound, frontier_size)
+
+    def finish(self, began):
+        """
+        Record the time since began and the peak memory of the process.
+        """
+        self.seconds = time.time() - began
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+            self.peak_memory_kb = peak // 1024 if sys.platform == "darwin" else peak
+
+    def as_dict(self):
+        return {
+            "expanded": self.expanded,
+            "generated": self.generated,
+            "duplicates": self.duplicates,
+            "stale_avoided": self.stale_avoided,
+            "max_frontier": self.max_frontier,
+            "heuristic_time": round(self.heuristic_time, 6),
+            "seconds": round(self.seconds, 6),
+            "peak_memory_kb": self.peak_memory_kb,
+        }
+
+
+class SearchTimeout(Exception):
+    """
+    Raised when a puzzle runs past its time limit in batch mode.
+    """
+
 
 class Piece:
     """
@@ -62,6 +324,33 @@ class Piece:
         self.coord_x = coord_x
         self.coord_y = coord_y
 
+    def moved(self, move):
+        """
+        Return a new piece one cell away from this one.
+
+        :param move: The direction of the move (one of 'd', 'u', 'r' or 'l').
+        :type move: str
+        :rtype: Piece
+        """
+
+        dx, dy = move_deltas[move]
+        return Piece(self.is_2_by_2, self.is_single, self.coord_x + dx,
+                     self.coord_y + dy, self.orientation)
+
+    def symbols(self):
+        """
+        Return the (x, y, symbol) of every cell covered by the piece.
+        """
+
+        x, y = self.coord_x, self.coord_y
+        if self.is_2_by_2:
+            return [(x, y, '1'), (x + 1, y, '1'), (x, y + 1, '1'), (x + 1, y + 1, '1')]
+        if self.is_single:
+            return [(x, y, char_single)]
+        if self.orientation == 'h':
+            return [(x, y, '<'), (x + 1, y, '>')]
+        return [(x, y, '^'), (x, y + 1, 'v')]
+
     def __repr__(self):
         return '{} {} {} {} {}'.format(self.is_2_by_2, self.is_single, \
                                        self.coord_x, self.coord_y, self.orientation)
@@ -72,10 +361,14 @@ class Board:
     Board class for setting up the playing board.
     """
 
-    def __init__(self, height, pieces):
+    __slots__ = ('width', 'height', 'pieces', 'grid', 'blanks')
+
+    def __init__(self, height, pieces, grid=None):
         """
         :param pieces: The list of Pieces
         :type pieces: List[Piece]
+        :param grid: A grid already matching the pieces, if the caller has one.
+        :type grid: Optional[List[List[str]]]
         """
 
         self.width = 4
@@ -85,8 +378,11 @@ class Board:
         # self.grid is a 2-d (size * size) array automatically generated
         # using the information on the pieces when a board is being created.
         # A grid contains the symbol for representing the pieces on the board.
-        self.grid = []
-        self.__construct_grid()
+        if grid is None:
+            self.grid = []
+            self.__construct_grid()
+        else:
+            self.grid = grid
 
         self.blanks = []
 
@@ -124,6 +420,40 @@ class Board:
                     self.grid[piece.coord_y][piece.coord_x] = '^'
                     self.grid[piece.coord_y + 1][piece.coord_x] = 'v'
 
+    def copy(self):
+        """
+        Return a board with its own grid rows and piece list, safe to change with
+        make_move.
+        """
+        return Board(self.height, self.pieces[:], [line[:] for line in self.grid])
+
+    def make_move(self, index, move):
+        """
+        Slide the piece at the given index one cell in place. Only the cells the
+        piece vacates and covers are written. Undo with unmake_move.
+
+        The board must own its rows (see copy), since boards made by do_the_move
+        share unchanged rows with their parent.
+
+        :param index: The index of the piece in self.pieces.
+        :type index: int
+        :param move: The direction of the move (one of 'd', 'u', 'r' or 'l').
+        :type move: str
+        """
+        piece = self.pieces[index]
+        moved = piece.moved(move)
+        for x, y, ch in piece.symbols():
+            self.grid[y][x] = '.'
+        for x, y, ch in moved.symbols():
+            self.grid[y][x] = ch
+        self.pieces[index] = moved
+
+    def unmake_move(self, index, move):
+        """
+        Undo make_move(index, move).
+        """
+        self.make_move(index, opposite_moves[move])
+
     def display(self):
         """
         Print out the current board.
@@ -141,8 +471,13 @@ class State:
     Note that State and Board are different. Board has the locations of the pieces.
     State has a Board and some extra information that is relevant to the search:
     heuristic function, f value, current depth and parent.
+
+    States sit in the search frontier by the thousands, so they use __slots__
+    and keep no path of their own; solution_path follows the parent pointers.
     """
 
+    __slots__ = ('board', 'h', 'g', 'f', 'depth', 'parent', 'h_parts', 'key')
+
     def __init__(self, board, depth, g=0, h=0, parent=None):
         """
         :param board: The board of the state.
@@ -164,181 +499,938 @@ class State:
         self.f = g + h
         self.depth = depth
         self.parent = parent
-        self.path = []
 
+        # Per piece kind contributions to h (see heuristic_parts), when known.
+        self.h_parts = None
+
+        # The packed key of the board (see BoardCodec), when known.
+        self.key = None
+
+
+# ====================================================================================
+# Compact state encoding
+#
+# A board of height h has 4 * h cells, numbered row by row (cell = y * 4 + x).
+# A packed board is a single integer holding one anchor bitboard per piece type,
+# where the anchor of a piece is its top left cell:
+#
+#     key = twos | singles << n | verticals << 2n | horizontals << 3n
+#
+# Pieces of the same type are interchangeable, so two boards get the same key
+# exactly when they have the same grid.
+
+KIND_2_BY_2 = 0
+KIND_SINGLE = 1
+KIND_VERTICAL = 2
+KIND_HORIZONTAL = 3
+
+# Offset of the anchor cell for each move direction.
+direction_offsets = {"d": 4, "u": -4, "r": 1, "l": -1}
+
+
+def piece_kind(piece):
+    """
+    :param piece: A piece on the board.
+    :type piece: Piece
+    :return: The KIND_* constant describing the shape of the piece.
+    :rtype: int
+    """
+    if piece.is_2_by_2:
+        return KIND_2_BY_2
+    if piece.is_single:
+        return KIND_SINGLE
+    if piece.orientation == 'v':
+        return KIND_VERTICAL
+    return KIND_HORIZONTAL
+
+
+class BoardCodec:
+    """
+    Converts boards of a given height to and from packed integer keys, and
+    generates successors, occupancy and grids directly from keys.
+    """
+
+    def __init__(self, height):
+        """
+        :param height: The height of the boards handled by this codec.
+        :type height: int
+        """
+
+        self.width = 4
+        self.height = height
+        self.size = self.width * height
+        self.full = (1 << self.size) - 1
+
+        column = [0] * self.width
+        for cell in range(self.size):
+            column[cell % self.width] |= 1 << cell
+        self.column = column
+        self.not_col0 = self.full & ~column[0]
+        self.not_col3 = self.full & ~column[3]
+        self.not_col23 = self.full & ~(column[2] | column[3])
+
+    def kind_mask(self, key, kind):
+        """
+        Return the anchor bitboard of one piece type.
+        """
+        return (key >> (kind * self.size)) & self.full
+
+    def encode(self, board):
+        """
+        :param board: The board to pack.
+        :type board: Board
+        :return: The packed key of the board.
+        :rtype: int
+        """
+        key = 0
+        for piece in board.pieces:
+            cell = piece.coord_y * self.width + piece.coord_x
+            key |= 1 << (cell + piece_kind(piece) * self.size)
+        return key
+
+    def moved_key(self, key, piece, move):
+        """
+        :param key: The packed key of a board holding piece.
+        :type key: int
+        :param piece: The piece to slide.
+        :type piece: Piece
+        :param move: The direction of the move (one of 'd', 'u', 'r' or 'l').
+        :type move: str
+        :return: The packed key of the board after the move.
+        :rtype: int
+        """
+        cell = piece_kind(piece) * self.size + piece.coord_y * self.width + piece.coord_x
+        return key ^ (1 << cell) ^ (1 << (cell + direction_offsets[move]))
+
+    def encode_grid(self, grid):
+        """
+        :param grid: A 2-d grid of characters, as in Board.grid.
+        :type grid: List[List[str]]
+        :return: The packed key of the grid.
+        :rtype: int
+        """
+        key = 0
+        for y, line in enumerate(grid):
+            for x, symbol in enumerate(line):
+                cell = y * self.width + x
+                if symbol == '1':
+                    # Only the top left cell of the 2x2 piece is its anchor.
+                    if (x == 0 or line[x - 1] != '1') and (y == 0 or grid[y - 1][x] != '1'):
+                        key |= 1 << cell
+                elif symbol == char_single:
+                    key |= 1 << (cell + self.size)
+                elif symbol == '^':
+                    key |= 1 << (cell + 2 * self.size)
+                elif symbol == '<':
+                    key |= 1 << (cell + 3 * self.size)
+        return key
+
+    def mirror(self, key):
+        """
+        :param key: A packed key.
+        :type key: int
+        :return: The packed key of the board reflected left to right.
+        :rtype: int
+        """
+        c0, c1, c2, c3 = self.column
+        mirrored = 0
+        for kind in range(4):
+            mask = self.kind_mask(key, kind)
+            if kind == KIND_2_BY_2 or kind == KIND_HORIZONTAL:
+                # Two cells wide: anchors in columns 0..2 map to 2 - x.
+                mask = (mask & c0) << 2 | mask & c1 | (mask & c2) >> 2
+            else:
+                mask = (mask & c0) << 3 | (mask & c1) << 1 | (mask & c2) >> 1 | (mask & c3) >> 3
+            mirrored |= mask << (kind * self.size)
+        return mirrored
+
+    def canonical(self, key):
+        """
+        Return the same key for a board and its mirror image.
+        """
+        return min(key, self.mirror(key))
+
+    def decode(self, key):
+        """
+        :param key: A packed key.
+        :type key: int
+        :return: The board described by the key.
+        :rtype: Board
+        """
+        pieces = []
+        for cell in range(self.size):
+            x, y = cell % self.width, cell // self.width
+            if (key >> cell) & 1:
+                pieces.append(Piece(True, False, x, y, None))
+            elif (key >> (cell + self.size)) & 1:
+                pieces.append(Piece(False, True, x, y, None))
+            elif (key >> (cell + 2 * self.size)) & 1:
+                pieces.append(Piece(False, False, x, y, 'v'))
+            elif (key >> (cell + 3 * self.size)) & 1:
+                pieces.append(Piece(False, False, x, y, 'h'))
+        return Board(self.height, pieces)
+
+    def occupancy(self, key):
+        """
+        Return the bitboard of every cell covered by a piece.
+        """
+        n = self.size
+        twos = key & self.full
+        singles = (key >> n) & self.full
+        verticals = (key >> 2 * n) & self.full
+        horizontals = (key >> 3 * n) & self.full
+        return (twos | twos << 1 | twos << 4 | twos << 5 | singles |
+                verticals | verticals << 4 | horizontals | horizontals << 1)
+
+    def grid(self, key):
+        """
+        :param key: A packed key.
+        :type key: int
+        :return: The 2-d grid of characters for the key, as in Board.grid.
+        :rtype: List[List[str]]
+        """
+        return self.decode(key).grid
+
+    def movable(self, key):
+        """
+        Find every piece that can slide one cell.
+
+        :param key: A packed key.
+        :type key: int
+        :return: A list of (kind, direction, anchors) triples, where anchors is the
+            bitboard of the pieces of that kind able to move in that direction.
+        :rtype: List[Tuple[int, str, int]]
+        """
+        n = self.size
+        empty = self.full & ~self.occupancy(key)
+        twos = key & self.full
+        singles = (key >> n) & self.full
+        verticals = (key >> 2 * n) & self.full
+        horizontals = (key >> 3 * n) & self.full
+
+        # A piece anchored at cell c can move when the cells it would newly cover
+        # are empty; shifting the empty bitboard lines those cells up with c.
+        return [
+            (KIND_2_BY_2, "d", twos & (empty >> 8) & (empty >> 9)),
+            (KIND_2_BY_2, "u", twos & (empty << 4) & (empty << 3)),
+            (KIND_2_BY_2, "r", twos & self.not_col23 & (empty >> 2) & (empty >> 6)),
+            (KIND_2_BY_2, "l", twos & self.not_col0 & (empty << 1) & (empty >> 3)),
+            (KIND_SINGLE, "d", singles & (empty >> 4)),
+            (KIND_SINGLE, "u", singles & (empty << 4)),
+            (KIND_SINGLE, "r", singles & self.not_col3 & (empty >> 1)),
+            (KIND_SINGLE, "l", singles & self.not_col0 & (empty << 1)),
+            (KIND_VERTICAL, "d", verticals & (empty >> 8)),
+            (KIND_VERTICAL, "u", verticals & (empty << 4)),
+            (KIND_VERTICAL, "r", verticals & self.not_col3 & (empty >> 1) & (empty >> 5)),
+            (KIND_VERTICAL, "l", verticals & self.not_col0 & (empty << 1) & (empty >> 3)),
+            (KIND_HORIZONTAL, "d", horizontals & (empty >> 4) & (empty >> 5)),
+            (KIND_HORIZONTAL, "u", horizontals & (empty << 4) & (empty << 3)),
+            (KIND_HORIZONTAL, "r", horizontals & self.not_col23 & (empty >> 2)),
+            (KIND_HORIZONTAL, "l", horizontals & self.not_col0 & (empty << 1)),
+        ]
+
+    def successors(self, key):
+        """
+        :param key: A packed key.
+        :type key: int
+        :return: The packed keys of every board one move away.
+        :rtype: List[int]
+        """
+        successors = []
+        for kind, move, anchors in self.movable(key):
+            shift = kind * self.size
+            offset = direction_offsets[move]
+            while anchors:
+                low = anchors & -anchors
+                anchors ^= low
+                moved = low << offset if offset > 0 else low >> -offset
+                successors.append(key ^ ((low | moved) << shift))
+        return successors
+
+
+# The (dx, dy) cells covered by a piece of each kind, relative to its anchor.
+kind_cells = {
+    KIND_2_BY_2: ((0, 0), (1, 0), (0, 1), (1, 1)),
+    KIND_SINGLE: ((0, 0),),
+    KIND_VERTICAL: ((0, 0), (0, 1)),
+    KIND_HORIZONTAL: ((0, 0), (1, 0)),
+}
+
+
+class MoveTable:
+    """
+    Every move a piece could make on an empty board of a given height:
+    moves[kind][anchor cell] lists, in d, u, r, l order, the (direction,
+    required empty mask) of each move staying on the board.
+    A move is legal when all the cells of its mask are empty.
+    """
+
+    # Turns a row-major grid string, reversed so that cell 0 comes last, into
+    # the binary digits of its empty bitboard.
+    empty_digits = str.maketrans({".": "1", "1": "0", char_single: "0", "<": "0",
+                                  ">": "0", "^": "0", "v": "0"})
+
+    def __init__(self, height):
+        """
+        :param height: The height of the boards handled by this table.
+        :type height: int
+        """
+        self.width = 4
+        self.height = height
+        size = self.width * height
+
+        self.moves = [[[] for cell in range(size)] for kind in range(4)]
+        for kind, cells in kind_cells.items():
+            for y in range(height):
+                for x in range(self.width):
+                    covered = self.__cover(cells, x, y)
+                    if covered is None:
+                        continue
+                    for move in "durl":
+                        dx, dy = move_deltas[move]
+                        moved = self.__cover(cells, x + dx, y + dy)
+                        if moved is not None:
+                            self.moves[kind][y * self.width + x].append(
+                                (move, moved & ~covered))
+
+    def __cover(self, cells, x, y):
+        """
+        Return the bitboard of the cells covered by a piece anchored at (x, y), or
+        None if it does not fit on the board.
+        """
+        mask = 0
+        for dx, dy in cells:
+            if not (0 <= x + dx < self.width and 0 <= y + dy < self.height):
+                return None
+            mask |= 1 << ((y + dy) * self.width + x + dx)
+        return mask
+
+    def empty(self, grid):
+        """
+        :param grid: A grid of this table's height, as in Board.grid.
+        :type grid: List[List[str]]
+        :return: The bitboard of the empty cells of the grid.
+        :rtype: int
+        """
+        digits = "".join(["".join(line) for line in grid])[::-1]
+        return int(digits.translate(self.empty_digits), 2)
+
+
+# The move table of each board height seen so far.
+move_tables = {}
+
+
+def move_table(height):
+    """
+    :return: The move table for boards of the given height, built on first use.
+    :rtype: MoveTable
+    """
+    table = move_tables.get(height)
+    if table is None:
+        table = move_tables[height] = MoveTable(height)
+    return table
+
+
+class HeuristicTable:
+    """
+    Heuristic engine for one goal board. It is built once per puzzle and holds,
+    for every piece kind and cell, the Manhattan distance from that cell to each
+    goal slot of the kind.
+
+    The heuristic matches the pieces of each kind to the goal slots of that kind
+    with the smallest total distance. A move shifts one piece by one cell, which
+    changes that total by at most one, so the heuristic is admissible and
+    consistent. Matchings are cached by the anchor bitboard of the kind.
+
+    Kinds of up to exact_limit pieces are matched by dynamic programming over
+    the subsets of goal slots, O(2^n * n), which is fast for the few pieces of
+    the standard boards. Larger kinds use the Hungarian algorithm, O(n^3).
+    """
+
+    exact_limit = 6
+
+    def __init__(self, the_goal_board):
+        """
+        :param the_goal_board: The goal board.
+        :type the_goal_board: Board
+        """
+
+        self.goal_board = the_goal_board
+        width = the_goal_board.width
+        size = width * the_goal_board.height
+
+        self.slots = [[], [], [], []]
+        for piece in the_goal_board.pieces:
+            self.slots[piece_kind(piece)].append((piece.coord_x, piece.coord_y))
+
+        # self.distance[kind][cell][j] is the distance from cell to goal slot j.
+        self.distance = []
+        for kind in range(4):
+            rows = []
+            for cell in range(size):
+                x, y = cell % width, cell // width
+                rows.append(tuple(abs(x - gx) + abs(y - gy) for gx, gy in self.slots[kind]))
+            self.distance.append(rows)
 
-def is_goal_state(state):
+        self.cache = [{}, {}, {}, {}]
+
+        # An optional PatternDatabase for the goal board; see pattern_database.
+        self.pattern_db = None
+
+    def cost(self, kind, mask):
+        """
+        :param kind: The KIND_* constant of the pieces.
+        :type kind: int
+        :param mask: The anchor bitboard of the pieces of that kind.
+        :type mask: int
+        :return: The smallest total distance from the pieces to the goal slots.
+        :rtype: int
+        """
+        cached = self.cache[kind].get(mask)
+        if cached is None:
+            cached = self.cache[kind][mask] = self.__assign(kind, mask)
+        return cached
+
+    def __assign(self, kind, mask):
+        """
+        Minimum cost matching of the pieces of a kind to its goal slots.
+        """
+        rows = []
+        while mask:
+            low = mask & -mask
+            mask ^= low
+            rows.append(self.distance[kind][low.bit_length() - 1])
+
+        n = len(self.slots[kind])
+        if len(rows) != n:
+            # Different piece counts: the goal cannot be reached.
+            return float("inf")
+        if n > self.exact_limit:
+            return self.__hungarian(rows)
+
+        # Dynamic programming over the set of used slots: piece i is placed once
+        # i slots are used.
+        best = [float("inf")] * (1 << n)
+        best[0] = 0
+        for used in range(1 << n):
+            i = bin(used).count("1")
+            if i == n or best[used] == float("inf"):
+                continue
+            row = rows[i]
+            for j in range(n):
+                if not (used >> j) & 1:
+                    value = best[used] + row[j]
+                    if value < best[used | (1 << j)]:
+                        best[used | (1 << j)] = value
+        return best[-1]
+
+    @staticmethod
+    def __hungarian(rows):
+        """
+        Minimum cost matching of a square cost matrix by the Hungarian algorithm
+        with row and column potentials. Rows are added one at a time, each along
+        a shortest augmenting path. Index 0 is a dummy column.
+        """
+        n = len(rows)
+        inf = float("inf")
+        row_potential = [0] * (n + 1)
+        column_potential = [0] * (n + 1)
+        # match[j] is the row, counting from 1, assigned to column j.
+        match = [0] * (n + 1)
+        way = [0] * (n + 1)
+        for i in range(1, n + 1):
+            match[0] = i
+            j0 = 0
+            slack = [inf] * (n + 1)
+            used = [False] * (n + 1)
+            while match[j0]:
+                used[j0] = True
+                i0 = match[j0]
+                row = rows[i0 - 1]
+                delta, j1 = inf, 0
+                for j in range(1, n + 1):
+                    if not used[j]:
+                        reduced = row[j - 1] - row_potential[i0] - column_potential[j]
+                        if reduced < slack[j]:
+                            slack[j] = reduced
+                            way[j] = j0
+                        if slack[j] < delta:
+                            delta, j1 = slack[j], j
+                for j in range(n + 1):
+                    if used[j]:
+                        row_potential[match[j]] += delta
+                        column_potential[j] -= delta
+                    else:
+                        slack[j] -= delta
+                j0 = j1
+            while j0:
+                j1 = way[j0]
+                match[j0] = match[j1]
+                j0 = j1
+        return sum(rows[match[j] - 1][j - 1] for j in range(1, n + 1))
+
+
+# The table of the most recent goal board, as [goal board, table].
+last_table = [None, None]
+
+
+def heuristic_table(the_goal_board):
+    """
+    :param the_goal_board: The goal board.
+    :type the_goal_board: Board
+    :return: The heuristic table of the goal board, built on first use.
+    :rtype: HeuristicTable
+    """
+    if last_table[0] is not the_goal_board:
+        last_table[0] = the_goal_board
+        last_table[1] = HeuristicTable(the_goal_board)
+    return last_table[1]
+
+
+def unmirror_path(codec, start, path):
+    """
+    Turn a path of canonical keys back into real boards. Mirroring commutes with
+    moves, so each next board is either the canonical key or its mirror image,
+    whichever is one move from the current board.
+
+    :param codec: The codec of the keys.
+    :type codec: BoardCodec
+    :param start: The packed key of the real initial board.
+    :type start: int
+    :param path: Canonical keys, first one for the initial board.
+    :type path: List[int]
+    :return: The packed keys of the real boards along the path.
+    :rtype: List[int]
+    """
+    real = [start]
+    for key in path[1:]:
+        if key not in codec.successors(real[-1]):
+            key = codec.mirror(key)
+        real.append(key)
+    return real
+
+
+def compact_heuristic(codec, key, table):
+    """
+    The heuristic of heuristic(), computed from a packed key.
+
+    :param codec: The codec the key was packed with.
+    :type codec: BoardCodec
+    :param key: A packed key.
+    :type key: int
+    :param table: The heuristic table of the goal board.
+    :type table: HeuristicTable
+    :return: The heuristic value (h) of the key.
+    :rtype: int
+    """
+    h = sum(table.cost(kind, codec.kind_mask(key, kind)) for kind in range(4))
+    if table.pattern_db is not None:
+        h = max(h, table.pattern_db.lookup(key))
+    return h
+
+
+# ====================================================================================
+# Pattern database
+#
+# The abstraction keeps the 2x2 piece and the blank cells, and forgets which of
+# the other pieces covers the remaining "filler" cells. Every real move is then
+# one of these abstract moves:
+#
+#   - the 2x2 piece slides into two blank cells,
+#   - a blank swaps with a neighbouring filler cell (a 1x1 piece moves, or a
+#     1x2 piece moves along its length when the blank jumps two cells),
+#   - two adjacent blanks swap with the two filler cells beside them (a 1x2 piece
+#     moves across its length).
+#
+# So the abstract distance to the abstract goal never exceeds the real one, and
+# it is an admissible heuristic. Distances are stored one byte per abstract state,
+# indexed by (2x2 anchor, rank of the blank set).
+
+pdb_magic = b'HRDPDB01'
+pdb_header = struct.Struct('<HH')
+pdb_unreachable = 255
+
+
+class PatternDatabase:
+    """
+    Abstract goal distances for one goal board, looked up by packed key.
+    """
+
+    def __init__(self, height, blanks, data, offset=0):
+        """
+        :param height: The height of the board.
+        :type height: int
+        :param blanks: The number of blank cells.
+        :type blanks: int
+        :param data: The distance bytes, e.g. a bytearray or a memory map.
+        :param offset: The position of the first distance in data.
+        :type offset: int
+        """
+
+        self.codec = BoardCodec(height)
+        self.blanks = blanks
+        self.data = data
+        self.offset = offset
+        # The file the database was loaded from, if any.
+        self.filename = None
+
+        n = self.codec.size
+        self.binomial = [[math.comb(cell, k) for k in range(blanks + 1)] for cell in range(n)]
+        self.blank_sets = math.comb(n, blanks)
+
+    def index(self, anchor, blank_mask):
+        """
+        :param anchor: The cell of the top left corner of the 2x2 piece.
+        :type anchor: int
+        :param blank_mask: The bitboard of the blank cells.
+        :type blank_mask: int
+        :return: The position of the abstract state in the database.
+        :rtype: int
+        """
+        rank = 0
+        i = 1
+        while blank_mask:
+            low = blank_mask & -blank_mask
+            blank_mask ^= low
+            rank += self.binomial[low.bit_length() - 1][i]
+            i += 1
+        return anchor * self.blank_sets + rank
+
+    def lookup(self, key):
+        """
+        :param key: A packed key.
+        :type key: int
+        :return: The abstract distance of the key to the goal.
+        :rtype: int
+        """
+        codec = self.codec
+        anchor = (key & codec.full).bit_length() - 1
+        blank_mask = codec.full & ~codec.occupancy(key)
+        if anchor < 0 or bin(blank_mask).count("1") != self.blanks:
+            # No 2x2 piece or other blanks than the goal: the goal cannot be reached.
+            return float("inf")
+        value = self.data[self.offset + self.index(anchor, blank_mask)]
+        return float("inf") if value == pdb_unreachable else value
+
+    def lookup_board(self, board):
+        """
+        :param board: A board.
+        :type board: Board
+        :return: The abstract distance of the board to the goal.
+        :rtype: int
+        """
+        return self.lookup(self.codec.encode(board))
+
+    def save(self, filename):
+        """
+        Write the database to filename in the format read by load. It is written
+        to a temporary file first and then moved into place, so other processes
+        never map a partly written database.
+        """
+        temporary = "{}.{}.tmp".format(filename, os.getpid())
+        with open(temporary, 'wb') as f:
+            f.write(pdb_magic)
+            f.write(pdb_header.pack(self.codec.height, self.blanks))
+            f.write(bytes(self.data[self.offset:]))
+        os.replace(temporary, filename)
+
+    @staticmethod
+    def load(filename):
+        """
+        Memory-map a database written by save.
+
+        :rtype: PatternDatabase
+        """
+        with open(filename, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if data[:len(pdb_magic)] != pdb_magic:
+            raise ValueError("{} is not a pattern database".format(filename))
+        height, blanks = pdb_header.unpack_from(data, len(pdb_magic))
+        db = PatternDatabase(height, blanks, data, len(pdb_magic) + pdb_header.size)
+        db.filename = filename
+        return db
+
+    @staticmethod
+    def build(the_goal_board):
+        """
+        Breadth first search backward from the abstract goal. Abstract moves are
+        reversible, so searching backward uses the forward moves.
+
+        :param the_goal_board: The goal board.
+        :type the_goal_board: Board
+        :rtype: PatternDatabase
+        """
+        codec = BoardCodec(the_goal_board.height)
+        n = codec.size
+        goal = codec.encode(the_goal_board)
+        goal_blanks = codec.full & ~codec.occupancy(goal)
+        blanks = bin(goal_blanks).count("1")
+
+        db = PatternDatabase(codec.height, blanks, None)
+        db.data = bytearray([pdb_unreachable]) * (n * db.blank_sets)
+
+        # neighbour[d][cell] is the cell next to cell in direction d, or -1.
+        neighbour = {}
+        for move, (dx, dy) in move_deltas.items():
+            neighbour[move] = []
+            for cell in range(n):
+                x, y = cell % 4 + dx, cell // 4 + dy
+                neighbour[move].append(y * 4 + x if 0 <= x < 4 and 0 <= y < codec.height else -1)
+
+        def two_by_two(anchor):
+            return 0b110011 << anchor
+
+        start = ((goal & codec.full).bit_length() - 1, goal_blanks)
+        db.data[db.index(*start)] = 0
+        layer = [start]
+        depth = 0
+        while layer:
+            depth += 1
+            value = min(depth, pdb_unreachable - 1)
+            next_layer = []
+            for anchor, blank_mask in layer:
+                twos = two_by_two(anchor)
+                filler = codec.full & ~twos & ~blank_mask
+                successors = []
+
+                # The 2x2 piece.
+                for move in "durl":
+                    moved = neighbour[move][anchor]
+                    if moved < 0 or moved % 4 == 3 or moved // 4 == codec.height - 1:
+                        continue
+                    new_twos = two_by_two(moved)
+                    if new_twos & ~twos & ~blank_mask:
+                        continue
+                    successors.append((moved, (blank_mask | twos) & ~new_twos))
+
+                # A blank and the filler cells beside it.
+                mask = blank_mask
+                while mask:
+                    low = mask & -mask
+                    mask ^= low
+                    cell = low.bit_length() - 1
+                    for move in "durl":
+                        first = neighbour[move][cell]
+                        if first < 0 or not (filler >> first) & 1:
+                            continue
+                        successors.append((anchor, blank_mask ^ low ^ (1 << first)))
+                        second = neighbour[move][first]
+                        if second >= 0 and (filler >> second) & 1:
+                            successors.append((anchor, blank_mask ^ low ^ (1 << second)))
+
+                    # Two adjacent blanks, moving across their length.
+                    for along, across in (("r", "du"), ("d", "rl")):
+                        other = neighbour[along][cell]
+                        if other < 0 or not (blank_mask >> other) & 1:
+                            continue
+                        for move in across:
+                            a, b = neighbour[move][cell], neighbour[move][other]
+                            if a >= 0 and b >= 0 and (filler >> a) & 1 and (filler >> b) & 1:
+                                successors.append((anchor, blank_mask ^ low ^ (1 << other) ^ (1 << a) ^ (1 << b)))
+
+                for successor in successors:
+                    i = db.index(*successor)
+                    if db.data[i] == pdb_unreachable:
+                        db.data[i] = value
+                        next_layer.append(successor)
+            layer = next_layer
+        return db
+
+
+def pattern_database(the_goal_board, directory):
+    """
+    Attach the pattern database of the goal board to its heuristic table. The
+    database is memory-mapped from directory, and built and saved there first if
+    it is missing. The abstraction keeps the 2x2 piece, so a goal without one
+    gets no database and the heuristic is left as it is.
+
+    :param the_goal_board: The goal board.
+    :type the_goal_board: Board
+    :param directory: The directory holding pattern databases.
+    :type directory: str
+    :return: The pattern database, or None if the goal has no 2x2 piece.
+    :rtype: Optional[PatternDatabase]
+    """
+    if not any(piece.is_2_by_2 for piece in the_goal_board.pieces):
+        return None
+    layout = grid_to_string(the_goal_board.grid).encode()
+    filename = os.path.join(directory, "hrd-{}.pdb".format(hashlib.sha1(layout).hexdigest()))
+    if not os.path.exists(filename):
+        os.makedirs(directory, exist_ok=True)
+        PatternDatabase.build(the_goal_board).save(filename)
+    db = PatternDatabase.load(filename)
+    heuristic_table(the_goal_board).pattern_db = db
+    return db
+
+
+def is_goal_state(state, the_goal_board):
     """
 
     :param state: The current state of a board
+    :param the_goal_board: The goal board
     :return: Return true iff state is a goal state
     return type: bool
     """
-    return state.board == goal_board
+    return state.board == the_goal_board
 
 
 def heuristic(the_board, the_goal_board):
     """
-    Calculate the heuristic value for the given state using Manhattan distance.
+    Calculate the heuristic value for the given state using Manhattan distance,
+    with each piece kind optimally matched to its goal slots (see HeuristicTable).
 
     :param the_board: The current board
     :param the_goal_board: The goal the board
     :return: The heuristic value (h) of the state
     """
 
-    # 0 is 2by2
-    # 1 is single
-    # 2 vertical
-    # 3 horizontal
-
-    distance = 0
-    the_pieces = [[], [], [], []]
-
-    for piece in the_goal_board.pieces:
-        index = 0 if piece.is_2_by_2 else 1 if piece.is_single else 2 if piece.orientation == "v" else 3
-        the_pieces[index].append(piece)
-
-    for piece in the_board.pieces:
-        if piece.is_2_by_2:
-            i, p = find_smallest_manhattan_distance(piece.coord_x, piece.coord_y, the_pieces[0])
-            the_pieces[0].remove(p)
-            distance += i
-        elif piece.is_single:
-            i, p = find_smallest_manhattan_distance(piece.coord_x, piece.coord_y, the_pieces[1])
-            the_pieces[1].remove(p)
-            distance += i
-        elif piece.orientation == "v":
-            i, p = find_smallest_manhattan_distance(piece.coord_x, piece.coord_y, the_pieces[2])
-            the_pieces[2].remove(p)
-            distance += i
-        elif piece.orientation == "h":
-            i, p = find_smallest_manhattan_distance(piece.coord_x, piece.coord_y, the_pieces[3])
-            the_pieces[3].remove(p)
-            distance += i
-
-    return distance
-
-
-def find_smallest_manhattan_distance(x, y, lst):
-    the_min = float("inf")
-    piece = None
-
-    for i in lst:
-        distance = abs(x - i.coord_x) + abs(y - i.coord_y)
-        if distance < the_min:
-            the_min = distance
-            piece = i
-
-    return the_min, piece
-
-
-def generate_successors(state, the_goal_board):
-    successors = []
-
-    for piece in state.board.pieces:
-        coordinate = (piece.coord_x, piece.coord_y)
-        if piece.is_2_by_2:
-            if (coordinate[1] + 2 < len(state.board.grid) and
-                    coordinate[0] < len(state.board.grid[0]) and
-                    coordinate[0] + 1 < len(state.board.grid[0]) and
-                    state.board.grid[coordinate[1] + 2][coordinate[0]] == "." and
-                    state.board.grid[coordinate[1] + 2][coordinate[0] + 1] == "."):
-                successors.append(do_the_move(state, piece, "d", the_goal_board))
-            if (coordinate[1] - 1 >= 0 and
-                    coordinate[0] < len(state.board.grid[0]) and
-                    coordinate[0] + 1 < len(state.board.grid[0]) and
-                    state.board.grid[coordinate[1] - 1][coordinate[0]] == "." and
-                    state.board.grid[coordinate[1] - 1][coordinate[0] + 1] == "."):
-                successors.append(do_the_move(state, piece, "u", the_goal_board))
-            if (coordinate[1] < len(state.board.grid) and
-                    coordinate[0] + 2 < len(state.board.grid[0]) and
-                    coordinate[1] + 1 < len(state.board.grid) and
-                    state.board.grid[coordinate[1]][coordinate[0] + 2] == "." and
-                    state.board.grid[coordinate[1] + 1][coordinate[0] + 2] == "."):
-                successors.append(do_the_move(state, piece, "r", the_goal_board))
-            if (coordinate[1] < len(state.board.grid) and
-                    coordinate[0] - 1 >= 0 and
-                    coordinate[1] + 1 < len(state.board.grid) and
-                    state.board.grid[coordinate[1]][coordinate[0] - 1] == "." and
-                    state.board.grid[coordinate[1] + 1][coordinate[0] - 1] == "."):
-                successors.append(do_the_move(state, piece, "l", the_goal_board))
-        elif piece.is_single:
-            if (coordinate[1] + 1 < len(state.board.grid) and
-                    state.board.grid[coordinate[1] + 1][coordinate[0]] == "."):
-                successors.append(do_the_move(state, piece, "d", the_goal_board))
-            if (coordinate[1] - 1 >= 0 and
-                    state.board.grid[coordinate[1] - 1][coordinate[0]] == "."):
-                successors.append(do_the_move(state, piece, "u", the_goal_board))
-            if (coordinate[0] + 1 < len(state.board.grid[0]) and
-                    state.board.grid[coordinate[1]][coordinate[0] + 1] == "."):
-                successors.append(do_the_move(state, piece, "r", the_goal_board))
-            if (coordinate[0] - 1 >= 0 and
-                    state.board.grid[coordinate[1]][coordinate[0] - 1] == "."):
-                successors.append(do_the_move(state, piece, "l", the_goal_board))
-        elif piece.orientation == "h":
-            if (coordinate[1] + 1 < len(state.board.grid) and
-                    coordinate[0] < len(state.board.grid[0]) and
-                    coordinate[0] + 1 < len(state.board.grid[0]) and
-                    state.board.grid[coordinate[1] + 1][coordinate[0]] == "." and
-                    state.board.grid[coordinate[1] + 1][coordinate[0] + 1] == "."):
-                successors.append(do_the_move(state, piece, "d", the_goal_board))
-            if (coordinate[1] - 1 >= 0 and
-                    coordinate[0] < len(state.board.grid[0]) and
-                    coordinate[0] + 1 < len(state.board.grid[0]) and
-                    state.board.grid[coordinate[1] - 1][coordinate[0]] == "." and
-                    state.board.grid[coordinate[1] - 1][coordinate[0] + 1] == "."):
-                successors.append(do_the_move(state, piece, "u", the_goal_board))
-            if (coordinate[0] + 2 < len(state.board.grid[0]) and
-                    state.board.grid[coordinate[1]][coordinate[0] + 2] == "."):
-                successors.append(do_the_move(state, piece, "r", the_goal_board))
-            if (coordinate[0] - 1 >= 0 and
-                    state.board.grid[coordinate[1]][coordinate[0] - 1] == "."):
-                successors.append(do_the_move(state, piece, "l", the_goal_board))
-        elif piece.orientation == "v":
-            if (coordinate[1] + 2 < len(state.board.grid) and
-                    state.board.grid[coordinate[1] + 2][coordinate[0]] == "."):
-                successors.append(do_the_move(state, piece, "d", the_goal_board))
-            if (coordinate[1] - 1 >= 0 and
-                    state.board.grid[coordinate[1] - 1][coordinate[0]] == "."):
-                successors.append(do_the_move(state, piece, "u", the_goal_board))
-            if (coordinate[0] + 1 < len(state.board.grid[0]) and
-                    coordinate[1] + 1 < len(state.board.grid) and
-                    state.board.grid[coordinate[1]][coordinate[0] + 1] == "." and
-                    state.board.grid[coordinate[1] + 1][coordinate[0] + 1] == "."):
-                successors.append(do_the_move(state, piece, "r", the_goal_board))
-            if (coordinate[0] - 1 >= 0 and
-                    coordinate[1] + 1 < len(state.board.grid) and
-                    state.board.grid[coordinate[1]][coordinate[0] - 1] == "." and
-                    state.board.grid[coordinate[1] + 1][coordinate[0] - 1] == "."):
-                successors.append(do_the_move(state, piece, "l", the_goal_board))
-
-    return successors
-
-
-def do_the_move(state, the_piece, move, the_goal_board):
-
-    pieces2 = []
-
-    for piece in state.board.pieces:
-        if piece == the_piece:
-            if move == "d":
-                pieces2.append(Piece(piece.is_2_by_2, piece.is_single, piece.coord_x, piece.coord_y + 1, piece.orientation))
-            elif move == "u":
-                pieces2.append(Piece(piece.is_2_by_2, piece.is_single, piece.coord_x, piece.coord_y - 1, piece.orientation))
-            elif move == "l":
-                pieces2.append(Piece(piece.is_2_by_2, piece.is_single, piece.coord_x - 1, piece.coord_y, piece.orientation))
-            elif move == "r":
-                pieces2.append(Piece(piece.is_2_by_2, piece.is_single, piece.coord_x + 1, piece.coord_y, piece.orientation))
-        else:
-            pieces2.append(piece)
+    h = sum(heuristic_parts(the_board, the_goal_board))
+    pattern_db = heuristic_table(the_goal_board).pattern_db
+    if pattern_db is not None:
+        h = max(h, pattern_db.lookup_board(the_board))
+    return h
 
-    board1 = Board(state.board.height, pieces2)
 
-    return State(board1, state.depth + 1, state.g + 1, heuristic(board1, the_goal_board), state)
+def heuristic_parts(the_board, the_goal_board):
+    """
+    Split the heuristic into one term per piece kind. Pieces are only matched
+    with goal pieces of their own kind, so moving a piece changes the term of
+    its kind alone.
 
+    :param the_board: The current board
+    :param the_goal_board: The goal the board
+    :return: The heuristic terms, indexed by KIND_* constant
+    """
+    return [kind_heuristic(the_board.pieces, the_goal_board, kind) for kind in range(4)]
+
+
+def kind_heuristic(pieces, the_goal_board, kind):
+    """
+    Match the pieces of one kind with the goal pieces of that kind.
+
+    :param pieces: The pieces of the current board
+    :param the_goal_board: The goal board
+    :param kind: The KIND_* constant of the pieces to match
+    :return: The smallest summed Manhattan distance of the matched pieces
+    """
+    mask = 0
+    for piece in pieces:
+        if piece_kind(piece) == kind:
+            mask |= 1 << (piece.coord_y * 4 + piece.coord_x)
+
+    return heuristic_table(the_goal_board).cost(kind, mask)
+
+
+def generate_moves(board, empty=None):
+    """
+    List the legal moves of a board without applying them. Each piece only tests
+    the precomputed masks of its moves (see MoveTable) against the empty cells.
+
+    :param board: The board to move on.
+    :type board: Board
+    :param empty: The bitboard of the empty cells of the board, if already known.
+    :type empty: Optional[int]
+    :return: (index of the piece in board.pieces, direction) of every legal move.
+    :rtype: List[Tuple[int, str]]
+    """
+    table = move_table(board.height)
+    if empty is None:
+        empty = table.empty(board.grid)
+    moves = []
+
+    for index, piece in enumerate(board.pieces):
+        for move, required in table.moves[piece_kind(piece)][piece.coord_y * 4 + piece.coord_x]:
+            if empty & required == required:
+                moves.append((index, move))
+
+    return moves
+
+
+def generate_successors(state, the_goal_board, stats=None):
+    pieces = state.board.pieces
+    return [do_the_move(state, pieces[index], move, the_goal_board, stats)
+            for index, move in generate_moves(state.board)]
+
+
+def do_the_move(state, the_piece, move, the_goal_board, stats=None):
+    """
+    Build the successor reached by sliding one piece. The new board shares every
+    untouched grid row with the parent, and only the heuristic term of the moved
+    piece's kind is recomputed.
+    """
+
+    board = state.board
+    index = board.pieces.index(the_piece)
+    moved = the_piece.moved(move)
+
+    pieces2 = board.pieces[:]
+    pieces2[index] = moved
+
+    grid = board.grid[:]
+    copied = set()
+    for x, y, ch in the_piece.symbols():
+        if y not in copied:
+            grid[y] = grid[y][:]
+            copied.add(y)
+        grid[y][x] = '.'
+    for x, y, ch in moved.symbols():
+        if y not in copied:
+            grid[y] = grid[y][:]
+            copied.add(y)
+        grid[y][x] = ch
+
+    board1 = Board(board.height, pieces2, grid)
+
+    began = time.perf_counter()
+    if state.h_parts is None:
+        state.h_parts = heuristic_parts(board, the_goal_board)
+    h_parts = state.h_parts[:]
+    kind = piece_kind(moved)
+    h_parts[kind] = kind_heuristic(pieces2, the_goal_board, kind)
+
+    h = sum(h_parts)
+    pattern_db = heuristic_table(the_goal_board).pattern_db
+    if pattern_db is not None:
+        h = max(h, pattern_db.lookup_board(board1))
+    if stats is not None:
+        stats.heuristic_time += time.perf_counter() - began
+
+    successor = State(board1, state.depth + 1, state.g + 1, h, state)
+    successor.h_parts = h_parts
+    return successor
+
+
+def solution_path(state):
+    """
+    Rebuild the grids from the initial state to the given state.
+
+    :param state: The last state of the path.
+    :type state: State
+    :return: The grids of every state on the path, first state first.
+    :rtype: List[List[List[str]]]
+    """
+    path = []
+    while state is not None:
+        path.append(state.board.grid)
+        state = state.parent
+    path.reverse()
+    return path
+
+
+def dfs(the_board, the_goal_board, compact=False, stats=None, trace=None):
+    """
+    :param trace: Called with the grid of every state popped from the frontier,
+        in order, or None.
+    :type trace: Optional[Callable]
+    :return: The grids from the initial to the goal board, or None if there is
+        no solution.
+    :rtype: Optional[List[List[List[str]]]]
+    """
+    if stats is None:
+        stats = SearchStats()
+    if compact:
+        return dfs_compact(the_board, the_goal_board, stats, trace)
 
-def dfs(the_board, the_goal_board):
-    s = ""
     state = State(the_board, 0, 0, 0)
     frontier = [state]
     explored = set()
@@ -346,38 +1438,1180 @@ def dfs(the_board, the_goal_board):
     while frontier:
         curr_state = frontier.pop()
         state_tuple = tuple(map(tuple, curr_state.board.grid))
-        s += grid_to_string(curr_state.board.grid) + "\n"  # used to be under line 351
+        if trace is not None:
+            trace(curr_state.board.grid)
         if state_tuple not in explored:
             explored.add(state_tuple)
-            if is_goal_state(curr_state):
-                return s
+            if is_goal_state(curr_state, the_goal_board):
+                return solution_path(curr_state)
             else:
-                for successor in generate_successors(curr_state, the_goal_board):
+                stats.expand(curr_state.g, len(frontier))
+                for successor in generate_successors(curr_state, the_goal_board, stats):
                     frontier.append(successor)
-    return "No solution"
+                    stats.generated += 1
+        else:
+            stats.duplicates += 1
+    return None
 
 
-def astar(the_board, the_goal_board):
+def astar(the_board, the_goal_board, compact=False, symmetry=False, stats=None,
+          frontier_name="heap"):
+    """
+    Successors start out as (piece, move) pairs whose packed key is worked out
+    from the parent's key. A pair is dropped when its key is already explored,
+    or already queued with no larger g; the board and heuristic of a successor
+    are only built for the pairs that survive.
+
+    With symmetry, a board and its mirror image share one explored entry when
+    the goal board is its own mirror image: both are then equally far from it.
+
+    :param frontier_name: The name of the frontier to use (see frontiers).
+    :type frontier_name: str
+    :return: The grids from the initial to the goal board, or None if there is
+        no solution.
+    :rtype: Optional[List[List[List[str]]]]
+    """
+    if stats is None:
+        stats = SearchStats()
+    if compact:
+        return astar_compact(the_board, the_goal_board, symmetry, stats, frontier_name)
+
+    codec = BoardCodec(the_board.height)
+    goal = codec.encode(the_goal_board)
+    symmetric = symmetry and codec.mirror(goal) == goal
 
     state = State(the_board, 0, 0, heuristic(the_board, the_goal_board))
+    state.key = codec.encode(the_board)
 
-    frontier = PriorityQueue()
-    frontier.insert(state)
-    state.path = [state.board.grid]
+    frontier = frontiers[frontier_name](stats)
+    frontier.insert(state.f, state.g, codec.canonical(state.key) if symmetric else state.key, state)
     explored = set()
+    # The smallest g each queued but unexplored key was queued with.
+    queued = {}
 
     while not frontier.is_empty():
         curr_state = frontier.extract()
-        state_tuple = tuple(map(tuple, curr_state.board.grid))
-        if state_tuple not in explored:
-            explored.add(state_tuple)
-            if is_goal_state(curr_state):
-                return "\n".join(grid_to_string(path) for path in curr_state.path)
+        state_key = codec.canonical(curr_state.key) if symmetric else curr_state.key
+        if state_key not in explored:
+            explored.add(state_key)
+            queued.pop(state_key, None)
+            if curr_state.key == goal:
+                return solution_path(curr_state)
+            else:
+                stats.expand(curr_state.f, len(frontier))
+                pieces = curr_state.board.pieces
+                g = curr_state.g + 1
+                empty = codec.full & ~codec.occupancy(curr_state.key)
+                for index, move in generate_moves(curr_state.board, empty):
+                    stats.generated += 1
+                    key = codec.moved_key(curr_state.key, pieces[index], move)
+                    successor_key = codec.canonical(key) if symmetric else key
+                    if successor_key in explored or queued.get(successor_key, g + 1) <= g:
+                        stats.duplicates += 1
+                        continue
+                    queued[successor_key] = g
+                    successor = do_the_move(curr_state, pieces[index], move, the_goal_board, stats)
+                    successor.key = key
+                    frontier.insert(successor.f, g, successor_key, successor)
+        else:
+            stats.duplicates += 1
+    return None
+
+
+def ida(the_board, the_goal_board, tt_size=0, stats=None):
+    """
+    Iterative deepening A*. Each iteration is a depth first search bounded by f,
+    run by making and unmaking moves on a single board, so memory grows with the
+    solution depth only. States already on the current path are skipped.
+
+    :param the_board: The initial board.
+    :type the_board: Board
+    :param the_goal_board: The goal board.
+    :type the_goal_board: Board
+    :param tt_size: The number of slots of the transposition table, or 0 for none.
+        A slot keeps the smallest g a state was reached with during the current
+        iteration; a state reached again with no smaller g is pruned. A new entry
+        replaces a slot that is empty, from an older iteration, or has a larger g.
+    :type tt_size: int
+    :param stats: Counters to fill in.
+    :type stats: Optional[SearchStats]
+    :return: The grids from the initial to the goal board, or None if there is
+        no solution.
+    :rtype: Optional[List[List[List[str]]]]
+    """
+    if stats is None:
+        stats = SearchStats()
+    codec = BoardCodec(the_board.height)
+    goal = codec.encode(the_goal_board)
+    pattern_db = heuristic_table(the_goal_board).pattern_db
+    board = the_board.copy()
+    start = codec.encode(board)
+
+    tt_keys = [None] * tt_size
+    tt_entries = [None] * tt_size
+
+    bound = heuristic(board, the_goal_board)
+    solution = None if start != goal else []
+
+    while solution is None and bound != float("inf"):
+        next_bound = float("inf")
+        applied = []  # (index, move) of every move on the current path
+        keys = [start]
+        parts = [heuristic_parts(board, the_goal_board)]
+        on_path = {start}
+        frames = [[generate_moves(board), 0]]
+        stats.expand(bound, 1)
+
+        while frames:
+            frame = frames[-1]
+            if frame[1] == len(frame[0]):
+                frames.pop()
+                if applied:
+                    board.unmake_move(*applied.pop())
+                    on_path.discard(keys.pop())
+                    parts.pop()
+                continue
+
+            index, move = frame[0][frame[1]]
+            frame[1] += 1
+            piece = board.pieces[index]
+            child = codec.moved_key(keys[-1], piece, move)
+            if child in on_path:
+                stats.duplicates += 1
+                continue
+
+            g = len(applied) + 1
+            if tt_size:
+                slot = hash(child) % tt_size
+                entry = tt_entries[slot]
+                if tt_keys[slot] == child and entry[1] == bound and entry[0] <= g:
+                    stats.duplicates += 1
+                    continue
+
+            board.make_move(index, move)
+            stats.generated += 1
+            began = time.perf_counter()
+            kind = piece_kind(piece)
+            h_parts = parts[-1][:]
+            h_parts[kind] = kind_heuristic(board.pieces, the_goal_board, kind)
+            h = sum(h_parts)
+            if pattern_db is not None:
+                h = max(h, pattern_db.lookup(child))
+            stats.heuristic_time += time.perf_counter() - began
+
+            if g + h > bound:
+                next_bound = min(next_bound, g + h)
+                board.unmake_move(index, move)
+                continue
+
+            if tt_size and (entry is None or entry[1] != bound or g < entry[0]):
+                tt_keys[slot] = child
+                tt_entries[slot] = (g, bound)
+
+            applied.append((index, move))
+            if child == goal:
+                solution = applied
+                break
+            keys.append(child)
+            parts.append(h_parts)
+            on_path.add(child)
+            frames.append([generate_moves(board), 0])
+            stats.expand(bound, len(frames))
+
+        bound = next_bound
+
+    if solution is None:
+        return None
+
+    # Replay the solution from the initial board to print it.
+    board = the_board.copy()
+    path = [[line[:] for line in board.grid]]
+    for index, move in solution:
+        board.make_move(index, move)
+        path.append([line[:] for line in board.grid])
+    return path
+
+
+def bidirectional(the_board, the_goal_board, symmetry=False, stats=None):
+    """
+    Breadth first search from both the initial and the goal board at once over
+    packed keys. Every move can be undone, so the backward search uses the same
+    successors as the forward one. Each side keeps a visited index from key to
+    (parent key, depth), and always the smaller frontier is expanded by a full
+    layer. The first layer that touches the other side decides the shortest
+    meeting point, and the two half paths are joined there.
+
+    With symmetry and a goal board that is its own mirror image, both sides hold
+    canonical keys only, and the joined path is unmirrored.
+
+    :return: The grids from the initial to the goal board, or None if there is
+        no solution.
+    :rtype: Optional[List[List[List[str]]]]
+    """
+    if stats is None:
+        stats = SearchStats()
+    codec = BoardCodec(the_board.height)
+    real_start = codec.encode(the_board)
+    goal = codec.encode(the_goal_board)
+    symmetric = symmetry and codec.mirror(goal) == goal
+    start = codec.canonical(real_start) if symmetric else real_start
+
+    forward = {start: (None, 0)}
+    backward = {goal: (None, 0)}
+    forward_layer = [start]
+    backward_layer = [goal]
+    meet = start if start == goal else None
+
+    while meet is None and forward_layer and backward_layer:
+        if len(forward_layer) <= len(backward_layer):
+            visited, other, layer = forward, backward, forward_layer
+        else:
+            visited, other, layer = backward, forward, backward_layer
+
+        best = float("inf")
+        next_layer = []
+        for key in layer:
+            depth = visited[key][1] + 1
+            stats.expand(depth - 1, len(layer) + len(next_layer))
+            for successor in codec.successors(key):
+                stats.generated += 1
+                if symmetric:
+                    successor = codec.canonical(successor)
+                if successor in visited:
+                    stats.duplicates += 1
+                    continue
+                visited[successor] = (key, depth)
+                next_layer.append(successor)
+                if successor in other and depth + other[successor][1] < best:
+                    best = depth + other[successor][1]
+                    meet = successor
+
+        if visited is forward:
+            forward_layer = next_layer
+        else:
+            backward_layer = next_layer
+
+    if meet is None:
+        return None
+
+    path = []
+    key = meet
+    while key is not None:
+        path.append(key)
+        key = forward[key][0]
+    path.reverse()
+    key = backward[meet][0]
+    while key is not None:
+        path.append(key)
+        key = backward[key][0]
+    if symmetric:
+        path = unmirror_path(codec, real_start, path)
+    return [codec.grid(key) for key in path]
+
+
+def dfs_compact(the_board, the_goal_board, stats, trace):
+    """
+    dfs() over packed keys; only the traced states and the solution are unpacked.
+    """
+    codec = BoardCodec(the_board.height)
+    goal = codec.encode(the_goal_board)
+    # (key, depth, parent key)
+    frontier = [(codec.encode(the_board), 0, None)]
+    explored = {}
+
+    while frontier:
+        key, depth, parent = frontier.pop()
+        if trace is not None:
+            trace(codec.grid(key))
+        if key not in explored:
+            explored[key] = parent
+            if key == goal:
+                path = []
+                while key is not None:
+                    path.append(codec.grid(key))
+                    key = explored[key]
+                path.reverse()
+                return path
+            else:
+                stats.expand(depth, len(frontier))
+                successors = codec.successors(key)
+                stats.generated += len(successors)
+                frontier.extend((successor, depth + 1, key) for successor in successors)
+        else:
+            stats.duplicates += 1
+    return None
+
+
+def astar_compact(the_board, the_goal_board, symmetry, stats, frontier_name):
+    """
+    astar() over packed keys. Each explored key remembers the key it was reached
+    from, and only the solution path is unpacked back into grids.
+
+    With symmetry and a goal board that is its own mirror image, the frontier and
+    the explored set hold canonical keys only, and the path is unmirrored at the
+    end.
+    """
+    codec = BoardCodec(the_board.height)
+    goal = codec.encode(the_goal_board)
+    table = heuristic_table(the_goal_board)
+    real_start = codec.encode(the_board)
+    symmetric = symmetry and codec.mirror(goal) == goal
+    start = codec.canonical(real_start) if symmetric else real_start
+
+    # (f, g, key, parent key) items
+    frontier = frontiers[frontier_name](stats)
+    f = compact_heuristic(codec, start, table)
+    frontier.insert(f, 0, start, (f, 0, start, None))
+    explored = {}
+    # The smallest g each queued but unexplored key was queued with.
+    queued = {}
+
+    while not frontier.is_empty():
+        f, g, key, parent = frontier.extract()
+        if key not in explored:
+            explored[key] = parent
+            queued.pop(key, None)
+            if key == goal:
+                path = []
+                while key is not None:
+                    path.append(key)
+                    key = explored[key]
+                path.reverse()
+                if symmetric:
+                    path = unmirror_path(codec, real_start, path)
+                return [codec.grid(key) for key in path]
+            else:
+                stats.expand(f, len(frontier))
+                for successor in codec.successors(key):
+                    stats.generated += 1
+                    if symmetric:
+                        successor = codec.canonical(successor)
+                    if successor not in explored and queued.get(successor, g + 2) > g + 1:
+                        queued[successor] = g + 1
+                        began = time.perf_counter()
+                        h = compact_heuristic(codec, successor, table)
+                        stats.heuristic_time += time.perf_counter() - began
+                        frontier.insert(g + 1 + h, g + 1, successor, (g + 1 + h, g + 1, successor, key))
+                    else:
+                        stats.duplicates += 1
+        else:
+            stats.duplicates += 1
+    return None
+
+
+# ====================================================================================
+# Parallel A* (HDA*)
+#
+# Every packed key is owned by one worker process, chosen by a hash of the key.
+# Each worker runs A* over the keys it owns, with its own open list and its own
+# index of best costs and parents. Successors owned by another worker are sent
+# to it in batches through its inbox queue.
+#
+# Workers may reach a key with a smaller cost after expanding it, so a key is
+# expanded again whenever its cost improves. When a worker pops the goal, the
+# shared incumbent cost is lowered to its cost, and every open key with f at
+# least the incumbent is pruned. The search is over when every worker is idle
+# and every batch sent has been received; the incumbent is then optimal, since
+# the heuristic is admissible and no open key could still beat it.
+
+hda_mix = 0x9E3779B97F4A7C15
+
+
+def hda_owner(key, workers):
+    """
+    :return: The index of the worker owning a packed key.
+    :rtype: int
+    """
+    return ((key * hda_mix) >> 64) % workers
+
+
+def hda_worker(me, workers, start, the_goal_board, pdb, inboxes, results, counters, incumbent,
+               batch_size):
+    """
+    The loop of one HDA* worker process.
+
+    :param me: The index of this worker.
+    :type me: int
+    :param start: The packed key of the initial board.
+    :type start: int
+    :param pdb: The file of the pattern database to use, or None.
+    :type pdb: Optional[str]
+    :param inboxes: The inbox queue of every worker.
+    :param results: The queue of replies to the coordinating process.
+    :param counters: (batches sent, batches received, idle) of every worker.
+    :param incumbent: The cost of the best solution found so far.
+    :param batch_size: The number of successors sent to a worker at once.
+    :type batch_size: int
+    """
+    codec = BoardCodec(the_goal_board.height)
+    goal = codec.encode(the_goal_board)
+    table = heuristic_table(the_goal_board)
+    if pdb is not None:
+        table.pattern_db = PatternDatabase.load(pdb)
+    lock = counters.get_lock()
+    inbox = inboxes[me]
+
+    # (f, -g, count, g, key): the smallest f first, then the largest g.
+    frontier = []
+    count = 0
+    best = {}
+    parents = {}
+    outgoing = [[] for _ in range(workers)]
+    expanded = generated = duplicates = 0
+
+    def receive(g, key, parent):
+        nonlocal count, duplicates
+        if best.get(key, g + 1) <= g:
+            duplicates += 1
+            return
+        best[key] = g
+        parents[key] = parent
+        f = g + compact_heuristic(codec, key, table)
+        heapq.heappush(frontier, (f, -g, count, g, key))
+        count += 1
+
+    def send(worker):
+        with lock:
+            counters[3 * me] += 1
+        inboxes[worker].put(("nodes", outgoing[worker]))
+        outgoing[worker] = []
+
+    if hda_owner(start, workers) == me:
+        receive(0, start, None)
+
+    idle = False
+    # The inbox is read until empty once every batch_size expansions, like the
+    # outgoing batches are flushed, and whenever there is nothing to expand.
+    unread = 0
+    while True:
+        message = None
+        if idle or not frontier or unread >= batch_size:
+            try:
+                message = inbox.get(timeout=0.05) if idle else inbox.get_nowait()
+            except queue.Empty:
+                unread = 0
+        if message is not None:
+            if message[0] == "nodes":
+                with lock:
+                    counters[3 * me + 1] += 1
+                    counters[3 * me + 2] = 0
+                idle = False
+                for g, key, parent in message[1]:
+                    receive(g, key, parent)
+            elif message[0] == "parent":
+                results.put((message[1], parents[message[1]]))
+            else:
+                results.put((expanded, generated, duplicates))
+                return
+            continue
+
+        if idle:
+            continue
+        if frontier:
+            f, _, _, g, key = heapq.heappop(frontier)
+            if g > best[key]:
+                continue
+            if f >= incumbent.value:
+                # Nothing left in the open list can beat the incumbent.
+                frontier = []
+                continue
+            if key == goal:
+                with incumbent.get_lock():
+                    if g < incumbent.value:
+                        incumbent.value = g
+                continue
+            expanded += 1
+            unread += 1
+            for successor in codec.successors(key):
+                generated += 1
+                worker = hda_owner(successor, workers)
+                if worker == me:
+                    receive(g + 1, successor, key)
+                else:
+                    outgoing[worker].append((g + 1, successor, key))
+                    if len(outgoing[worker]) >= batch_size:
+                        send(worker)
+            if expanded % batch_size == 0:
+                for worker in range(workers):
+                    if outgoing[worker]:
+                        send(worker)
+        else:
+            for worker in range(workers):
+                if outgoing[worker]:
+                    send(worker)
+            with lock:
+                counters[3 * me + 2] = 1
+            idle = True
+
+
+def hda(the_board, the_goal_board, processes=None, stats=None, batch_size=256):
+    """
+    A* spread over worker processes, in the style of HDA* (see above).
+
+    :param processes: The number of worker processes (default: one per CPU).
+    :type processes: Optional[int]
+    :param batch_size: The number of successors sent to a worker at once.
+    :type batch_size: int
+    :return: The grids from the initial to the goal board, or None if there is
+        no solution.
+    :rtype: Optional[List[List[List[str]]]]
+    """
+    if stats is None:
+        stats = SearchStats()
+    workers = processes or os.cpu_count() or 1
+    codec = BoardCodec(the_board.height)
+    start = codec.encode(the_board)
+    goal = codec.encode(the_goal_board)
+    pattern_db = heuristic_table(the_goal_board).pattern_db
+    pdb = pattern_db.filename if pattern_db is not None else None
+
+    inboxes = [multiprocessing.Queue() for _ in range(workers)]
+    results = multiprocessing.Queue()
+    counters = multiprocessing.Array('q', 3 * workers)
+    unsolved = 1 << 62
+    incumbent = multiprocessing.Value('q', unsolved)
+    worker_processes = [multiprocessing.Process(target=hda_worker,
+                                                args=(i, workers, start, the_goal_board, pdb,
+                                                      inboxes, results, counters, incumbent,
+                                                      batch_size),
+                                                daemon=True)
+                        for i in range(workers)]
+    for process in worker_processes:
+        process.start()
+    try:
+        # A consistent snapshot of the counters, taken under their lock, shows
+        # termination once every worker is idle and no batch is in flight.
+        while True:
+            time.sleep(0.01)
+            with counters.get_lock():
+                values = counters[:]
+            if (all(values[3 * i + 2] for i in range(workers)) and
+                    sum(values[0::3]) == sum(values[1::3])):
+                break
+
+        path = None
+        cost = incumbent.value
+        if cost != unsolved:
+            path = [goal]
+            while path[-1] != start:
+                inboxes[hda_owner(path[-1], workers)].put(("parent", path[-1]))
+                path.append(results.get()[1])
+            path.reverse()
+
+        for inbox in inboxes:
+            inbox.put(("stop",))
+        for _ in range(workers):
+            expanded, generated, duplicates = results.get()
+            stats.expanded += expanded
+            stats.generated += generated
+            stats.duplicates += duplicates
+        for process in worker_processes:
+            process.join()
+    finally:
+        for process in worker_processes:
+            if process.is_alive():
+                process.terminate()
+
+    if path is None:
+        return None
+    # The optimality check: the parents of the goal must form a path from the
+    # initial board with exactly as many moves as the incumbent cost.
+    if len(path) - 1 != cost or any(b not in codec.successors(a) for a, b in zip(path, path[1:])):
+        raise RuntimeError("hda found cost {} but a path of {} moves".format(cost, len(path) - 1))
+    return [codec.grid(key) for key in path]
+
+
+# ====================================================================================
+# External memory breadth first search
+#
+# Enumerates every board reachable from a start board, one depth layer at a time,
+# keeping only a bounded buffer of packed keys in memory. Each layer is a file of
+# sorted, distinct keys, stored as fixed width big-endian records so that the byte
+# order of two records is their numeric order.
+#
+# Every move can be undone, so the successors of layer d lie in layers d - 1, d
+# and d + 1. Layer d + 1 is therefore what is left of the successors of layer d
+# once layers d - 1 and d are merged out of them.
+
+
+def layer_path(directory, depth):
+    return os.path.join(directory, "layer-{:04d}.bin".format(depth))
+
+
+def write_keys(path, keys, width):
+    """
+    Write an iterable of keys to a file of width byte records.
+
+    :return: The number of keys written.
+    :rtype: int
+    """
+    count = 0
+    with open(path, 'wb') as f:
+        buffer = []
+        for key in keys:
+            buffer.append(key.to_bytes(width, "big"))
+            if len(buffer) == 4096:
+                f.write(b"".join(buffer))
+                count += len(buffer)
+                buffer = []
+        f.write(b"".join(buffer))
+        count += len(buffer)
+    return count
+
+
+def read_keys(path, width):
+    """
+    Yield the keys of a file written by write_keys, in file order.
+    """
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(width * 4096)
+            if not chunk:
+                return
+            for i in range(0, len(chunk), width):
+                yield int.from_bytes(chunk[i:i + width], "big")
+
+
+def unique(keys):
+    """
+    Yield the distinct keys of a sorted iterable.
+    """
+    last = None
+    for key in keys:
+        if key != last:
+            yield key
+            last = key
+
+
+def difference(keys, removed, stats=None):
+    """
+    Yield the keys of a sorted iterable that are not in another sorted iterable.
+
+    :param stats: Counters whose duplicates is incremented for every key dropped.
+    :type stats: Optional[SearchStats]
+    """
+    removed = iter(removed)
+    other = next(removed, None)
+    for key in keys:
+        while other is not None and other < key:
+            other = next(removed, None)
+        if key == other:
+            if stats is not None:
+                stats.duplicates += 1
+        else:
+            yield key
+
+
+def external_bfs(the_board, directory, symmetry=False, buffer_keys=1 << 20, stats=None,
+                 report=None):
+    """
+    Write every layer of the breadth first search from a board to directory, as
+    layer-<depth>.bin files of sorted packed keys (see BoardCodec).
+
+    The successors of a layer are collected in a buffer of at most buffer_keys
+    keys. A full buffer is sorted and written out as a run, and the runs are then
+    merged together with the previous two layers into the next layer. Memory use
+    is bounded by the buffer, not by the size of the state space.
+
+    :param symmetry: Store a board and its mirror image as one canonical key.
+    :type symmetry: bool
+    :param buffer_keys: The number of keys to collect before writing a run.
+    :type buffer_keys: int
+    :param report: Called as report(depth, size) once each layer is written.
+    :type report: Optional[Callable]
+    :return: The number of boards in each layer, by depth.
+    :rtype: List[int]
+    """
+    if stats is None:
+        stats = SearchStats()
+    codec = BoardCodec(the_board.height)
+    width = (4 * codec.size + 7) // 8
+    os.makedirs(directory, exist_ok=True)
+
+    start = codec.encode(the_board)
+    if symmetry:
+        start = codec.canonical(start)
+    sizes = [write_keys(layer_path(directory, 0), [start], width)]
+    if report is not None:
+        report(0, sizes[0])
+
+    depth = 0
+    while sizes[depth]:
+        runs = []
+        buffer = []
+        for key in read_keys(layer_path(directory, depth), width):
+            stats.expand(depth, sizes[depth])
+            for successor in codec.successors(key):
+                stats.generated += 1
+                buffer.append(codec.canonical(successor) if symmetry else successor)
+            if len(buffer) >= buffer_keys:
+                runs.append(os.path.join(directory, "run-{:04d}.bin".format(len(runs))))
+                buffer.sort()
+                write_keys(runs[-1], unique(buffer), width)
+                buffer = []
+        buffer.sort()
+
+        successors = unique(heapq.merge(buffer, *[read_keys(run, width) for run in runs]))
+        previous = [read_keys(layer_path(directory, depth), width)]
+        if depth > 0:
+            previous.append(read_keys(layer_path(directory, depth - 1), width))
+        fresh = difference(successors, heapq.merge(*previous), stats)
+        sizes.append(write_keys(layer_path(directory, depth + 1), fresh, width))
+        for run in runs:
+            os.remove(run)
+
+        depth += 1
+        if report is not None and sizes[depth]:
+            report(depth, sizes[depth])
+
+    # The search ends on an empty layer, which is not part of the result.
+    os.remove(layer_path(directory, depth))
+    sizes.pop()
+    return sizes
+
+
+def solve(board, goal_board, algo, compact=False, symmetry=False, tt_size=0, stats=None,
+          trace=None, frontier="heap", processes=None):
+    """
+    Run one of the search algorithms offered by --algo.
+
+    :param stats: Counters to fill in, including the search time and peak memory.
+    :type stats: Optional[SearchStats]
+    :param trace: For dfs, called with the grid of every state it pops.
+    :type trace: Optional[Callable]
+    :param frontier: For astar, the name of the frontier to use (see frontiers).
+    :type frontier: str
+    :param processes: For hda, the number of worker processes.
+    :type processes: Optional[int]
+    :return: The grids from the initial to the goal board, or None if there is
+        no solution.
+    :rtype: Optional[List[List[List[str]]]]
+    """
+    if stats is None:
+        stats = SearchStats()
+    began = time.time()
+    try:
+        if algo == "dfs":
+            return dfs(board, goal_board, compact, stats, trace)
+        elif algo == "astar":
+            return astar(board, goal_board, compact, symmetry, stats, frontier)
+        elif algo == "ida":
+            return ida(board, goal_board, tt_size, stats)
+        elif algo == "bidir":
+            return bidirectional(board, goal_board, symmetry, stats)
+        elif algo == "hda":
+            return hda(board, goal_board, processes, stats)
+        raise ValueError("Unknown algorithm {}".format(algo))
+    finally:
+        stats.finish(began)
+
+
+def write_solution(out, path):
+    """
+    Stream a solution path to a text file, one grid at a time, with an empty
+    line between grids.
+
+    :param out: The file to write to.
+    :param path: The grids of the solution, or None if there is no solution.
+    :type path: Optional[Iterable[List[List[str]]]]
+    """
+    if path is None:
+        out.write("No solution")
+        return
+    for i, grid in enumerate(path):
+        if i:
+            out.write("\n")
+        out.write(grid_to_string(grid))
+
+
+def solve_to_file(board, goal_board, outputfile, algo, trace=True, stats=None, cache=None,
+                  **options):
+    """
+    Solve a puzzle and stream the result to outputfile.
+
+    dfs writes every state it pops, as it pops it, unless trace is False; the
+    other algorithms, and dfs without trace, write the solution path. If there is
+    no solution, the file holds "No solution" only.
+
+    The algorithms other than dfs find optimal paths, so with a cache they answer
+    from it when the initial board lies on a cached path to the same goal, and
+    store the paths they find.
+
+    :param outputfile: The name of the output file.
+    :type outputfile: str
+    :param algo: The search algorithm, as for --algo.
+    :type algo: str
+    :param trace: Whether dfs writes its trace rather than the solution path.
+    :type trace: bool
+    :param cache: The solution cache, or None.
+    :type cache: Optional[SolutionCache]
+    :param options: Further keyword arguments for solve.
+    :return: The number of moves of the solution, or None if there is none.
+    :rtype: Optional[int]
+    """
+    if algo == "dfs":
+        cache = None
+    if cache is not None:
+        path = cache.lookup(board.grid, goal_board.grid)
+        if path is not None:
+            with open(outputfile, 'w', buffering=1 << 16) as out:
+                write_solution(out, path)
+            return len(path) - 1
+
+    with open(outputfile, 'w', buffering=1 << 16) as out:
+        tracer = None
+        if algo == "dfs" and trace:
+            def tracer(grid):
+                out.write(grid_to_string(grid))
+                out.write("\n")
+
+        path = solve(board, goal_board, algo, stats=stats, trace=tracer, **options)
+
+        if path is None:
+            if tracer is not None:
+                out.seek(0)
+                out.truncate()
+            write_solution(out, None)
+            return None
+        if tracer is None:
+            write_solution(out, path)
+    if cache is not None:
+        cache.store(path)
+    return len(path) - 1
+
+
+# ====================================================================================
+# Solution cache
+#
+# A file of optimal solution paths, indexed by a digest of (board grid, goal grid)
+# for every board along each path: the rest of an optimal path is an optimal path
+# from any of its boards. The file is memory-mapped and laid out as
+#
+#     magic, header (use clock, path count, entry count)
+#     path table: (height, length, data offset, last use) per path
+#     entry index: (digest, path, position) per board, sorted by digest
+#     path data: the packed keys of each path, 2 * height bytes each, big-endian
+#
+# so a lookup is a binary search of the entry index, and a hit only writes the
+# use clock and the last use of its path. Storing a path rewrites the file.
+
+solution_cache_magic = b'HRDSOL01'
+solution_cache_header = struct.Struct('<QII')
+solution_cache_path = struct.Struct('<IIQQ')
+solution_cache_entry = struct.Struct('<16sII')
+
+
+def state_digest(grid, goal_grid):
+    """
+    :return: The 16 byte cache digest of a board grid and a goal grid. Grids do not
+        depend on the order of the pieces, so equal boards get equal digests.
+    :rtype: bytes
+    """
+    layout = grid_to_string(grid) + "\n" + grid_to_string(goal_grid)
+    return hashlib.sha1(layout.encode()).digest()[:16]
+
+
+class SolutionCache:
+    """
+    A persistent cache of optimal solution paths (see above), bounded to at most
+    capacity boards over all paths. When a new path does not fit, the least
+    recently used paths are evicted. A path longer than capacity is not stored.
+    """
+
+    def __init__(self, filename, capacity=1000000):
+        """
+        :param filename: The cache file, created by the first store if missing.
+        :type filename: str
+        :param capacity: The largest number of boards kept over all paths.
+        :type capacity: int
+        """
+        self.filename = filename
+        self.capacity = capacity
+        self.data = None
+        self.clock = 0
+        self.path_count = 0
+        self.entry_count = 0
+        self.__open()
+
+    def __open(self):
+        if not os.path.exists(self.filename) or os.path.getsize(self.filename) == 0:
+            return
+        with open(self.filename, 'r+b') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
+        if self.data[:len(solution_cache_magic)] != solution_cache_magic:
+            raise ValueError("{} is not a solution cache".format(self.filename))
+        self.clock, self.path_count, self.entry_count = \
+            solution_cache_header.unpack_from(self.data, len(solution_cache_magic))
+        self.paths_offset = len(solution_cache_magic) + solution_cache_header.size
+        self.entries_offset = self.paths_offset + self.path_count * solution_cache_path.size
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def __find(self, digest):
+        """
+        Binary search the entry index.
+
+        :return: (path, position) of the board with this digest, or None.
+        :rtype: Optional[Tuple[int, int]]
+        """
+        low, high = 0, self.entry_count
+        size = solution_cache_entry.size
+        while low < high:
+            middle = (low + high) // 2
+            offset = self.entries_offset + middle * size
+            found = self.data[offset:offset + 16]
+            if found < digest:
+                low = middle + 1
+            elif found > digest:
+                high = middle
             else:
-                for successor in generate_successors(curr_state, the_goal_board):
-                    successor.path = curr_state.path + [successor.board.grid]
-                    frontier.insert(successor)
-    return "No solution"
+                return solution_cache_entry.unpack_from(self.data, offset)[1:]
+        return None
+
+    def __path(self, path):
+        """
+        :return: (height, packed keys, last use) of a stored path.
+        :rtype: Tuple[int, List[int], int]
+        """
+        height, length, offset, last_use = solution_cache_path.unpack_from(
+            self.data, self.paths_offset + path * solution_cache_path.size)
+        width = 2 * height
+        keys = [int.from_bytes(self.data[offset + i * width:offset + (i + 1) * width], "big")
+                for i in range(length)]
+        return height, keys, last_use
+
+    def lookup(self, grid, goal_grid):
+        """
+        :param grid: The grid of the initial board.
+        :type grid: List[List[str]]
+        :param goal_grid: The grid of the goal board.
+        :type goal_grid: List[List[str]]
+        :return: The grids of a cached optimal path from grid to goal_grid, or None
+            if no cached path goes through grid toward goal_grid.
+        :rtype: Optional[List[List[List[str]]]]
+        """
+        if self.data is None:
+            return None
+        found = self.__find(state_digest(grid, goal_grid))
+        if found is None:
+            return None
+        path, position = found
+        height, keys, _ = self.__path(path)
+
+        self.clock += 1
+        solution_cache_header.pack_into(self.data, len(solution_cache_magic), self.clock,
+                                        self.path_count, self.entry_count)
+        # The last use is the 8 byte field at the end of the path record.
+        record = self.paths_offset + (path + 1) * solution_cache_path.size
+        struct.pack_into('<Q', self.data, record - 8, self.clock)
+
+        codec = BoardCodec(height)
+        return [codec.grid(key) for key in keys[position:]]
+
+    def store(self, path):
+        """
+        Add an optimal solution path, evicting least recently used paths as needed,
+        and rewrite the cache file. Only the boards of the new path are digested;
+        the entries and path data of the paths kept are copied from the old file.
+
+        :param path: The grids of the path, ending with the goal grid.
+        :type path: List[List[List[str]]]
+        """
+        if len(path) > self.capacity:
+            return
+        height = len(path[0])
+        codec = BoardCodec(height)
+        keys = [codec.encode_grid(grid) for grid in path]
+        self.clock += 1
+
+        # The stored paths as (last use, index, height, length, data offset), most
+        # recently used first.
+        stored = []
+        if self.data is not None:
+            for i in range(self.path_count):
+                stored_height, length, offset, last_use = solution_cache_path.unpack_from(
+                    self.data, self.paths_offset + i * solution_cache_path.size)
+                stored.append((last_use, i, stored_height, length, offset))
+            stored.sort(key=lambda record: -record[0])
+
+        # The new path is path 0, followed by the most recently used paths that fit.
+        kept = []
+        renumbered = {}
+        boards = len(keys)
+        for record in stored:
+            if boards + record[3] > self.capacity:
+                continue
+            renumbered[record[1]] = len(kept) + 1
+            kept.append(record)
+            boards += record[3]
+
+        # The new path wins the entry of a board it shares with a stored path. The
+        # entries of evicted paths are dropped, even for boards that are also on a
+        # path kept, which only costs a cache miss later on.
+        goal_grid = codec.grid(keys[-1])
+        new_entries = {}
+        for position, key in enumerate(keys):
+            new_entries.setdefault(state_digest(codec.grid(key), goal_grid), (0, position))
+        entries = []
+        if self.data is not None:
+            index = self.data[self.entries_offset:
+                              self.entries_offset + self.entry_count * solution_cache_entry.size]
+            for digest, stored_path, position in solution_cache_entry.iter_unpack(index):
+                if stored_path in renumbered and digest not in new_entries:
+                    entries.append((digest, renumbered[stored_path], position))
+        entries = list(heapq.merge(entries, sorted((digest, stored_path, position)
+                                                   for digest, (stored_path, position)
+                                                   in new_entries.items())))
+
+        offset = (len(solution_cache_magic) + solution_cache_header.size +
+                  (len(kept) + 1) * solution_cache_path.size +
+                  len(entries) * solution_cache_entry.size)
+        temporary = self.filename + ".tmp"
+        with open(temporary, 'wb') as f:
+            f.write(solution_cache_magic)
+            f.write(solution_cache_header.pack(self.clock, len(kept) + 1, len(entries)))
+            f.write(solution_cache_path.pack(height, len(keys), offset, self.clock))
+            offset += len(keys) * 2 * height
+            for last_use, _, stored_height, length, _ in kept:
+                f.write(solution_cache_path.pack(stored_height, length, offset, last_use))
+                offset += length * 2 * stored_height
+            f.write(b"".join(solution_cache_entry.pack(*entry) for entry in entries))
+            f.write(b"".join(key.to_bytes(2 * height, "big") for key in keys))
+            for _, _, stored_height, length, data_offset in kept:
+                f.write(self.data[data_offset:data_offset + length * 2 * stored_height])
+
+        self.close()
+        os.replace(temporary, self.filename)
+        self.__open()
+
+
+def print_progress(stats, bound, frontier_size):
+    """
+    Progress callback for SearchStats that reports to standard error.
+    """
+    print("expanded {} bound {} frontier {}".format(stats.expanded, bound, frontier_size),
+          file=sys.stderr)
+
+
+def raise_timeout(signum, frame):
+    raise SearchTimeout()
+
+
+def solve_file(inputfile, algo, timeout=None, pdb=None, **options):
+    """
+    Solve one puzzle file in a batch worker and write the solution next to it,
+    as <name>.<algo>.out so that reference .out files are left alone.
+
+    :param inputfile: The puzzle file.
+    :type inputfile: str
+    :param algo: The search algorithm, as for --algo.
+    :type algo: str
+    :param timeout: The time limit in seconds, or None for no limit.
+    :type timeout: Optional[float]
+    :param pdb: The pattern database directory, or None.
+    :type pdb: Optional[str]
+    :param options: Further keyword arguments for solve.
+    :return: One summary record of the batch.
+    :rtype: dict
+    """
+    start = time.time()
+    stats = SearchStats()
+    record = {"puzzle": inputfile, "status": "timeout", "moves": None}
+
+    # SIGALRM interrupts the search from inside the worker, so the pool can
+    # reuse the worker for the next puzzle. Platforms without it get no limit.
+    use_alarm = timeout and hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    outputfile = "{}.{}.out".format(os.path.splitext(inputfile)[0], algo)
+    try:
+        board, goal_board = read_from_file(inputfile)
+        if pdb:
+            pattern_database(goal_board, pdb)
+        moves = solve_to_file(board, goal_board, outputfile, algo, stats=stats, **options)
+        record["output"] = outputfile
+        record["status"] = "unsolved" if moves is None else "solved"
+        record["moves"] = moves
+    except SearchTimeout:
+        # Drop the partial output of the interrupted search.
+        if os.path.exists(outputfile):
+            os.remove(outputfile)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    record["expanded"] = stats.expanded
+    record["generated"] = stats.generated
+    record["seconds"] = round(time.time() - start, 3)
+    return record
+
+
+def batch_inputs(pattern):
+    """
+    :param pattern: A directory, whose .txt files are taken, or a glob pattern.
+    :type pattern: str
+    :return: The puzzle files, sorted by name.
+    :rtype: List[str]
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.txt")
+    return sorted(glob.glob(pattern))
+
+
+def batch(pattern, algo, summary, workers=None, timeout=None, pdb=None, **options):
+    """
+    Solve every puzzle matched by pattern on a pool of worker processes.
+
+    One JSON line is written to summary per puzzle, in completion order, and a
+    last line sums up the batch.
+
+    :param pattern: A directory or glob pattern of puzzle files.
+    :type pattern: str
+    :param algo: The search algorithm, as for --algo.
+    :type algo: str
+    :param summary: A text file to write the JSON lines to.
+    :param workers: The number of worker processes (default: one per CPU).
+    :type workers: Optional[int]
+    :param timeout: The time limit of each puzzle in seconds.
+    :type timeout: Optional[float]
+    :param pdb: The pattern database directory, or None.
+    :type pdb: Optional[str]
+    :param options: Further keyword arguments for solve.
+    """
+    start = time.time()
+    totals = {"solved": 0, "unsolved": 0, "timeout": 0, "error": 0, "expanded": 0}
+
+    # Build the missing pattern databases once, before the workers would each
+    # build their own copy. Puzzles that cannot be read are left for their
+    # worker to report.
+    if pdb:
+        for inputfile in batch_inputs(pattern):
+            try:
+                goal_board = read_from_file(inputfile)[1]
+            except Exception:
+                continue
+            pattern_database(goal_board, pdb)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(solve_file, inputfile, algo, timeout, pdb, **options): inputfile
+                   for inputfile in batch_inputs(pattern)}
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+                totals["expanded"] += record["expanded"]
+            except Exception as e:
+                record = {"puzzle": futures[future], "status": "error", "error": str(e)}
+            totals[record["status"]] += 1
+            summary.write(json.dumps(record) + "\n")
+            summary.flush()
+
+    totals["puzzles"] = len(futures)
+    totals["seconds"] = round(time.time() - start, 3)
+    summary.write(json.dumps({"summary": totals}) + "\n")
 
 
 def read_from_file(filename):
@@ -441,12 +2675,7 @@ def read_from_file(filename):
 
 
 def grid_to_string(grid):
-    string = ""
-    for i, line in enumerate(grid):
-        for ch in line:
-            string += ch
-        string += "\n"
-    return string
+    return "".join(["".join(line) + "\n" for line in grid])
 
 
 if __name__ == "__main__":
@@ -454,32 +2683,169 @@ if __name__ == "__main__":
     parser.add_argument(
         "--inputfile",
         type=str,
-        required=True,
         help="The input file that contains the puzzles."
     )
     parser.add_argument(
         "--outputfile",
         type=str,
-        required=True,
         help="The output file that contains the solution."
     )
     parser.add_argument(
         "--algo",
         type=str,
-        required=True,
-        choices=['astar', 'dfs'],
+        choices=['astar', 'dfs', 'ida', 'bidir', 'hda'],
         help="The searching algorithm."
     )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Search over bit-packed board encodings instead of Board objects."
+    )
+    parser.add_argument(
+        "--pdb",
+        type=str,
+        metavar="DIR",
+        help="Directory of pattern databases to use alongside the Manhattan heuristic."
+    )
+    parser.add_argument(
+        "--tt-size",
+        type=int,
+        default=0,
+        help="Number of transposition table slots for ida (0 disables the table)."
+    )
+    parser.add_argument(
+        "--symmetry",
+        action="store_true",
+        help="Merge mirror image boards in astar and bidir when the goal is symmetric."
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="Number of worker processes for hda (default: one per CPU)."
+    )
+    parser.add_argument(
+        "--frontier",
+        type=str,
+        default="heap",
+        choices=sorted(frontiers),
+        help="The astar frontier: a heap of (f, count) entries, an indexed heap "
+             "with one entry per board, or buckets by f that prefer larger g."
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        metavar="FILE",
+        help="Answer from, and add to, a persistent cache of optimal solutions."
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1000000,
+        help="Number of boards the --cache file keeps, over all of its paths."
+    )
+    parser.add_argument(
+        "--enumerate",
+        type=str,
+        metavar="DIR",
+        help="Write every breadth first layer reachable from the input board to DIR, "
+             "as sorted files of packed boards, and print the layer sizes."
+    )
+    parser.add_argument(
+        "--buffer-keys",
+        type=int,
+        default=1 << 20,
+        help="Number of boards --enumerate collects in memory before writing a sorted run."
+    )
+    parser.add_argument(
+        "--batch",
+        type=str,
+        metavar="DIR_OR_GLOB",
+        help="Solve every puzzle in a directory (*.txt) or matching a glob, in parallel."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes for --batch (default: one per CPU)."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="Time limit in seconds for each puzzle of --batch."
+    )
+    parser.add_argument(
+        "--summary",
+        type=str,
+        default="-",
+        help="File for the JSON lines summary of --batch (default: standard output)."
+    )
+    parser.add_argument(
+        "--stats",
+        type=str,
+        metavar="FILE",
+        help="Write search statistics to FILE as JSON."
+    )
+    parser.add_argument(
+        "--progress",
+        type=int,
+        metavar="N",
+        help="Report the f bound and frontier size on standard error every N expansions."
+    )
+    parser.add_argument(
+        "--no-trace",
+        dest="trace",
+        action="store_false",
+        help="Make dfs write the solution path instead of every state it visits."
+    )
     args = parser.parse_args()
 
+    if args.progress:
+        stats = SearchStats(print_progress, args.progress)
+    else:
+        stats = SearchStats()
+
+    if args.enumerate:
+        if not args.inputfile:
+            parser.error("--inputfile is required with --enumerate")
+        board, goal_board = read_from_file(args.inputfile)
+        began = time.time()
+        sizes = external_bfs(board, args.enumerate, args.symmetry, args.buffer_keys, stats,
+                             lambda depth, size: print("layer {}: {}".format(depth, size)))
+        stats.finish(began)
+        print("total: {} boards, {} layers".format(sum(sizes), len(sizes)))
+        if args.stats:
+            with open(args.stats, 'w') as f:
+                json.dump(stats.as_dict(), f, indent=2)
+        sys.exit()
+
+    if not args.algo:
+        parser.error("--algo is required without --enumerate")
+
+    options = {"compact": args.compact, "symmetry": args.symmetry, "tt_size": args.tt_size,
+               "trace": args.trace, "frontier": args.frontier, "processes": args.processes}
+
+    if args.batch:
+        if args.summary == "-":
+            batch(args.batch, args.algo, sys.stdout, args.workers, args.timeout, args.pdb, **options)
+        else:
+            with open(args.summary, 'w') as summary:
+                batch(args.batch, args.algo, summary, args.workers, args.timeout, args.pdb, **options)
+        sys.exit()
+
+    if not args.inputfile or not args.outputfile:
+        parser.error("--inputfile and --outputfile are required without --batch")
+
     # read the board from the file
     board, goal_board = read_from_file(args.inputfile)
 
-    if args.algo == "dfs":
-        finalSolution = dfs(board, goal_board)
+    if args.pdb:
+        pattern_database(goal_board, args.pdb)
 
-    elif args.algo == "astar":
-        finalSolution = astar(board, goal_board)
+    cache = SolutionCache(args.cache, args.cache_size) if args.cache else None
+    solve_to_file(board, goal_board, args.outputfile, args.algo, stats=stats, cache=cache,
+                  **options)
+    if cache is not None:
+        cache.close()
 
-    with open(args.outputfile, 'w') as f:
-        f.write(finalSolution)
+    if args.stats:
+        with open(args.stats, 'w') as f:
+            json.dump(stats.as_dict(), f, indent=2)